@@ -1,52 +1,118 @@
+import base64
+
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import Prefetch
+from django.http import FileResponse
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path
+from django.urls import reverse
 from django.utils.html import format_html
+from django.utils.html import format_html_join
 from django_softdelete.admin import GlobalObjectsModelAdmin
-from qr_code import qrcode
-from shortener import shortener
 
+from trakset_app.users.models import User
+
+from .labels import LABEL_BASE_URL
+from .labels import refresh_asset_labels
 from .models import AssetProxy
+from .models import AssetTransferNotes
 from .models import AssetTransferProxy
 from .models import AssetTypeProxy
 from .models import LocationProxy
+from .models import LabelSheet
 from .models import StatusProxy
+from .outbox import enqueue
+from .pagination import EstimatedCountPaginator
+from .tasks import generate_label_sheet
 
 
 # Register your models here.
 @admin.register(AssetProxy)
 class AssetAdmin(GlobalObjectsModelAdmin):
+    # Counts come from planner estimates on large tables, and the changelist
+    # skips the second, unfiltered count it shows beside filtered results.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Labels are made when an asset is saved here, or the first time it is
+    # listed, so rendering a page only reads the stored short link and PNG.
+    @admin.display(description="QR Tag")
     def qr_tag(self, obj):
-        url = self.uri + f"trakset/assets/transfer/{obj.unique_id}/"
-        url_short = f"{shortener.get_or_create(self.user, url, refresh=True)}"
-        self.final_url = f"{self.uri}s/{url_short}"
-        options = qrcode.utils.QRCodeOptions(image_format="png", size=5)
-        qrcode_url = qrcode.maker.make_embedded_qr_code(
-            self.final_url,
-            options,
-            force_text=True,
-            use_data_uri_for_svg=False,
-            alt_text=url,
-            class_names="qr-code",
+        return format_html(
+            '<img src="data:image/png;base64,{}" alt="{}" class="qr-code">',
+            base64.b64encode(obj.label.qr_code).decode(),
+            obj.label.url,
         )
-        return format_html("{}", qrcode_url)
 
+    @admin.display(description="Transfer URL")
     def transfer_url(self, obj):
-        return format_html("{}", self.final_url)
+        return obj.label.short_url
 
     def changelist_view(self, request, extra_context=None):
-        self.user = request.user
-        self.uri = f"{request.scheme}://{request.get_host()}/"
-        return super().changelist_view(
+        response = super().changelist_view(
             request,
             extra_context=extra_context,
         )
+        changelist = (getattr(response, "context_data", None) or {}).get("cl")
+        if changelist is not None:
+            refresh_asset_labels(
+                changelist.result_list,
+                LABEL_BASE_URL,
+                request.user,
+            )
+        return response
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_asset_labels([obj], LABEL_BASE_URL, request.user)
+
+    @admin.action(description="Print labels for selected assets")
+    def make_label_sheet(self, request, queryset):
+        with transaction.atomic():
+            sheet = LabelSheet.objects.create(
+                requested_by=request.user,
+                base_url=LABEL_BASE_URL,
+            )
+            sheet.assets.add(*queryset.values_list("pk", flat=True))
+            enqueue(generate_label_sheet, str(sheet.pk))
+        self.message_user(
+            request,
+            format_html(
+                'The labels are being printed to <a href="{}">{}</a>.',
+                reverse("admin:trakset_labelsheet_change", args=[sheet.pk]),
+                sheet,
+            ),
+        )
 
-    @admin.display(description="Status", ordering="-asset_type")
+    # The holder, type, status, location and transfer columns read the
+    # asset's AssetState row, so the page cost does not grow with each
+    # asset's history.
+    @admin.display(description="Current Holder", ordering="state__holder_username")
+    def holder_username(self, obj):
+        return obj.state.holder_username
+
+    @admin.display(description="Status", ordering="state__status_type")
     def status_display_name(self, obj):
-        return str(obj.status.status_type)
+        return obj.state.status_type
 
-    @admin.display(description="Asset Type", ordering=("-name"))
+    @admin.display(description="Asset Type", ordering="state__asset_type_name")
     def asset_type_name(self, obj):
-        return str(obj.asset_type.name)
+        return obj.state.asset_type_name
+
+    @admin.display(description="Location", ordering="state__location_name")
+    def location_name(self, obj):
+        return obj.state.location_name
+
+    @admin.display(description="Last Transferred", ordering="state__last_transfer_at")
+    def last_transfer_at(self, obj):
+        return obj.state.last_transfer_at
+
+    @admin.display(description="Transfers", ordering="state__transfer_count")
+    def transfer_count(self, obj):
+        return obj.state.transfer_count
 
     @admin.display(description="Description")
     def asset_description(self, obj):
@@ -65,17 +131,20 @@ class AssetAdmin(GlobalObjectsModelAdmin):
     def has_been_deleted(self, obj):
         return obj.is_deleted
 
+    actions = ["make_label_sheet"]
     list_display = (
         "unique_id",
         "created_at",
         "last_updated",
         "has_been_deleted",
-        "current_holder",
+        "holder_username",
         "name",
         "asset_description",
         "asset_type_name",
         "status_display_name",
-        "location__name",
+        "location_name",
+        "last_transfer_at",
+        "transfer_count",
         "serial_number",
         "security_tag_number",
         "get_send_user_email_on_transfer",
@@ -102,14 +171,15 @@ class AssetAdmin(GlobalObjectsModelAdmin):
     exclude = ("deleted_at", "restored_at", "transaction_id")
 
     def get_queryset(self, request):
-        qs = (
-            self.model.global_objects.select_related(
-                "asset_type",
-                "location",
-                "current_holder",
-            )
-            .prefetch_related("transfers")
-            .defer("id")
+        qs = self.model.global_objects.select_related(
+            "state", "label"
+        ).prefetch_related(
+            Prefetch(
+                "send_user_email_on_transfer",
+                queryset=User.objects.only("id", "username").order_by(
+                    "username",
+                ),
+            ),
         )
         ordering = (
             self.ordering or ()
@@ -121,6 +191,8 @@ class AssetAdmin(GlobalObjectsModelAdmin):
 
 @admin.register(AssetTypeProxy)
 class TypeAdmin(GlobalObjectsModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     search_fields = ("name", "description")
     ordering = ("-id",)
     readonly_fields = ("created_at", "last_updated")
@@ -146,6 +218,8 @@ class TypeAdmin(GlobalObjectsModelAdmin):
 
 @admin.register(LocationProxy)
 class LocationAdmin(GlobalObjectsModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display = ("id", "name", "description", "has_been_deleted")
     search_fields = ("name", "description")
     ordering = ("-id",)
@@ -170,6 +244,8 @@ class LocationAdmin(GlobalObjectsModelAdmin):
 
 @admin.register(StatusProxy)
 class StatusAdmin(GlobalObjectsModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fields = ["status_type"]
     list_display = ("status_type", "has_been_deleted")
     exclude = ("deleted_at", "restored_at", "transaction_id")
@@ -192,11 +268,13 @@ class StatusAdmin(GlobalObjectsModelAdmin):
 
 @admin.register(AssetTransferProxy)
 class AssetTransferAdmin(GlobalObjectsModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     list_display_links = None
     list_display = (
         "id",
         "asset__name",
-        "asset__current_holder",
+        "asset__state__holder_username",
         "from_user",
         "to_user",
         "get_notes_text",
@@ -231,15 +309,29 @@ class AssetTransferAdmin(GlobalObjectsModelAdmin):
 
     @admin.display(description="Transfer Notes", ordering="notes")
     def get_notes_text(self, obj):
-        html_string = ""
-        idx = 1
-        for note in obj.notes.all():
-            html_string += "<li>Note" + str(idx) + ": " + note.text + "</li>"
-            idx += 1
-        return format_html(html_string)
+        return format_html_join(
+            "",
+            "<li>Note{}: {}</li>",
+            ((idx, note.text) for idx, note in enumerate(obj.notes.all(), 1)),
+        )
 
     def get_queryset(self, request):
-        qs = self.model.global_objects.get_queryset()
+        # One query for the page's transfers with their asset, state and
+        # users, and one for all of their notes.
+        qs = self.model.global_objects.select_related(
+            "asset__state",
+            "from_user",
+            "to_user",
+        ).prefetch_related(
+            Prefetch(
+                "notes",
+                queryset=AssetTransferNotes.objects.only(
+                    "id",
+                    "text",
+                    "asset_transfer",
+                ).order_by("created_at", "id"),
+            ),
+        )
 
         # we need this from the superclass method
         ordering = (
@@ -248,3 +340,73 @@ class AssetTransferAdmin(GlobalObjectsModelAdmin):
         if ordering:
             qs = qs.order_by(*ordering)
         return qs
+
+
+@admin.register(LabelSheet)
+class LabelSheetAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_display = (
+        "id",
+        "created_at",
+        "requested_by",
+        "status",
+        "asset_count",
+        "page_count",
+        "download",
+    )
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "created_at",
+        "last_updated",
+        "requested_by",
+        "status",
+        "page_count",
+        "error",
+        "download",
+    )
+    exclude = ("assets", "base_url", "file")
+
+    @admin.display(description="Assets", ordering="asset_count")
+    def asset_count(self, obj):
+        return obj.asset_count
+
+    @admin.display(description="Download")
+    def download(self, obj):
+        if not obj.file:
+            return ""
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse("admin:trakset_labelsheet_download", args=[obj.pk]),
+            obj.file.name.rsplit("/", 1)[-1],
+        )
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("requested_by")
+            .annotate(asset_count=Count("assets"))
+        )
+
+    def get_urls(self):
+        return [
+            path(
+                "<uuid:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="trakset_labelsheet_download",
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        """Serve the sheet's PDF to staff, without exposing MEDIA_URL."""
+        sheet = get_object_or_404(LabelSheet, pk=pk)
+        if not self.has_view_permission(request, sheet) or not sheet.file:
+            raise Http404
+        return FileResponse(sheet.file.open("rb"), as_attachment=True)
+
+    def has_add_permission(self, request):
+        # Sheets are requested through the asset admin's action.
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AssetMgmtConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "trakset"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,140 @@
+import hashlib
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Asset
+from .search import get_search_backend
+
+ASSET_CACHE_TIMEOUT = getattr(settings, "TRAKSET_ASSET_CACHE_TIMEOUT", 300)
+SEARCH_CACHE_TIMEOUT = getattr(settings, "TRAKSET_SEARCH_CACHE_TIMEOUT", 300)
+SEARCH_GENERATION_KEY = "trakset:search:generation"
+# Query string parameters, besides the search itself, that change the results.
+SEARCH_PARAMS = ("search_type", "deleted_cb", "asset", "after", "before")
+# Suggestions are not invalidated on write, so keep them short lived.
+AUTOCOMPLETE_CACHE_TIMEOUT = getattr(
+    settings,
+    "TRAKSET_AUTOCOMPLETE_CACHE_TIMEOUT",
+    30,
+)
+
+
+@dataclass(frozen=True)
+class AssetSnapshot:
+    """The parts of an asset the scan path needs, as stored in the cache."""
+
+    pk: int
+    unique_id: str
+    name: str
+    location_name: str | None
+    is_deleted: bool
+
+    @classmethod
+    def from_asset(cls, asset):
+        return cls(
+            pk=asset.pk,
+            unique_id=str(asset.unique_id),
+            name=asset.name,
+            location_name=asset.location.name if asset.location else None,
+            is_deleted=asset.is_deleted,
+        )
+
+
+def asset_cache_key(unique_id):
+    return f"trakset:asset:{unique_id}"
+
+
+async def aget_asset_snapshot(unique_id):
+    """
+    Return a snapshot of the asset with this unique_id, soft-deleted or not.
+
+    Snapshots are read through the cache, so repeated scans of the same tag
+    skip the database.  Returns None if the asset does not exist.
+    """
+    key = asset_cache_key(unique_id)
+    snapshot = await cache.aget(key)
+    if snapshot is None:
+        asset = (
+            await Asset.global_objects.select_related("location")
+            .only("id", "unique_id", "name", "deleted_at", "location__name")
+            .filter(unique_id=unique_id)
+            .afirst()
+        )
+        if asset is None:
+            return None
+        snapshot = AssetSnapshot.from_asset(asset)
+        await cache.aset(key, snapshot, ASSET_CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate_asset_snapshots(unique_ids):
+    """Drop cached snapshots once the current transaction commits."""
+    keys = [asset_cache_key(unique_id) for unique_id in unique_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def autocomplete_cache_key(query, limit):
+    digest = hashlib.sha256(query.casefold().encode()).hexdigest()
+    return f"trakset:autocomplete:{limit}:{digest}"
+
+
+async def aget_autocomplete(query, limit):
+    """Return up to limit suggestions for query, read through the cache."""
+    key = autocomplete_cache_key(query, limit)
+    suggestions = await cache.aget(key)
+    if suggestions is None:
+        backend = get_search_backend()
+        await backend.aprepare()
+        suggestions = [
+            suggestion
+            async for suggestion in backend.autocomplete(
+                Asset.objects.all(),
+                query,
+                limit,
+            ).values(
+                "unique_id",
+                "name",
+                "serial_number",
+                "security_tag_number",
+            )[:limit]
+        ]
+        await cache.aset(key, suggestions, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return suggestions
+
+
+def _new_search_generation():
+    # Starting from the clock means a generation evicted from the cache is
+    # never reused, which could otherwise serve results cached under it.
+    return time.time_ns()
+
+
+async def aget_search_generation():
+    """Return the current search generation, part of every search cache key."""
+    generation = await cache.aget(SEARCH_GENERATION_KEY)
+    if generation is None:
+        generation = _new_search_generation()
+        if not await cache.aadd(SEARCH_GENERATION_KEY, generation, None):
+            generation = await cache.aget(SEARCH_GENERATION_KEY, generation)
+    return generation
+
+
+def bump_search_generation():
+    """Invalidate every cached search once the current transaction commits."""
+    transaction.on_commit(_bump_search_generation)
+
+
+def _bump_search_generation():
+    try:
+        cache.incr(SEARCH_GENERATION_KEY)
+    except ValueError:
+        cache.add(SEARCH_GENERATION_KEY, _new_search_generation(), None)
+
+
+def search_cache_key(generation, search, params):
+    """Key a search on its normalized text and the parameters in params."""
+    parts = [search.casefold(), *(params.get(name, "") for name in SEARCH_PARAMS)]
+    digest = hashlib.sha256("\0".join(parts).encode()).hexdigest()
+    return f"trakset:search:{generation}:{digest}"
@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from dataclasses import field
+
+from .pagination import aestimated_count
+from .pagination import akeyset_page
+from .pagination import cursor_pk_type
+from .pagination import decode_cursor
+
+MAX_LENGTH = 100
+# The order keyset pagination reads rows in, newest first.
+KEYSET_ORDERING = ["-created_at"]
+
+
+@dataclass(frozen=True)
+class Column:
+    """A DataTables column, as named in columns[i][data], and its ORM field."""
+
+    name: str
+    field: str
+    orderable: bool = False
+    render: object = None
+
+    def value(self, row):
+        value = row[self.field]
+        return self.render(value) if self.render else value
+
+
+@dataclass(frozen=True)
+class DataTablesRequest:
+    """The parts of a DataTables server-side request the views use."""
+
+    draw: int
+    start: int
+    length: int
+    search: str
+    ordering: list = field(default_factory=list)
+
+    @classmethod
+    def from_query(cls, query, columns, max_length=MAX_LENGTH):
+        """
+        Parse the request's query string.
+
+        Only orderable columns are sorted on, so clients cannot order by an
+        unindexed field, and the page length is capped at max_length.
+        """
+        ordering = []
+        i = 0
+        while f"order[{i}][column]" in query:
+            index = _int(query.get(f"order[{i}][column]"), -1)
+            if 0 <= index < len(columns) and columns[index].orderable:
+                prefix = "-" if query.get(f"order[{i}][dir]") == "desc" else ""
+                ordering.append(prefix + columns[index].field)
+            i += 1
+        length = _int(query.get("length"), max_length)
+        return cls(
+            draw=_int(query.get("draw"), 0),
+            start=max(_int(query.get("start"), 0), 0),
+            length=max_length if length < 1 else min(length, max_length),
+            search=query.get("search[value]", "").strip(),
+            ordering=ordering,
+        )
+
+    async def aresponse(self, columns, queryset, filtered, after=None):
+        """
+        Return the DataTables response body for a page of filtered.
+
+        queryset is the unfiltered set of rows, counted for recordsTotal.  Large
+        counts are estimated, as in the admin.  Rows are newest first unless
+        the client orders them.  In that order the first page, and the page
+        after the cursor in after, are read by keyset pagination, and the
+        response's next_cursor leads on to the page after.  Other orders, and
+        pages jumped to, are read with an OFFSET.
+        """
+        records_total = await aestimated_count(queryset)
+        records_filtered = (
+            await aestimated_count(filtered) if self.search else records_total
+        )
+        fields = {"pk", *(column.field for column in columns)}
+        rows = filtered.values(*fields)
+        next_cursor = None
+        if self.ordering in ([], KEYSET_ORDERING) and (
+            self.start == 0
+            or (after and decode_cursor(after, cursor_pk_type(filtered.model)))
+        ):
+            page = await akeyset_page(
+                rows,
+                after=after if self.start else None,
+                per_page=self.length,
+            )
+            rows, next_cursor = page.object_list, page.next_cursor
+        else:
+            # Break ties on the primary key so pages do not overlap.
+            rows = [
+                row
+                async for row in rows.order_by(
+                    *(self.ordering or KEYSET_ORDERING),
+                    "-pk",
+                )[self.start : self.start + self.length]
+            ]
+        return {
+            "draw": self.draw,
+            "recordsTotal": records_total,
+            "recordsFiltered": records_filtered,
+            "data": [
+                {column.name: column.value(row) for column in columns} for row in rows
+            ],
+            "next_cursor": next_cursor,
+        }
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
@@ -1,3 +1,6 @@
+import re
+import uuid
+
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
@@ -14,3 +17,28 @@ class AssetTransferNotesForm(forms.ModelForm):
         help_texts = {
             "text": _("Any additional information regarding the transfer."),
         }
+
+
+UUID_RE = re.compile(
+    r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}",
+    re.IGNORECASE,
+)
+
+
+class AssetBulkTransferForm(forms.Form):
+    unique_ids = forms.CharField(
+        label=_("Asset IDs"),
+        help_text=_(
+            "Scan or paste the asset IDs or transfer links, one per line.",
+        ),
+        widget=forms.Textarea(attrs={"rows": 10, "autofocus": True}),
+    )
+
+    def clean_unique_ids(self):
+        unique_ids = [
+            uuid.UUID(match)
+            for match in UUID_RE.findall(self.cleaned_data["unique_ids"])
+        ]
+        if not unique_ids:
+            raise forms.ValidationError(_("No asset IDs were found."))
+        return unique_ids
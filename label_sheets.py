@@ -0,0 +1,113 @@
+"""
+Printable label sheets, rendered with Pillow.
+
+Nothing here touches Django, so render_page() can run in a pool worker
+process without the app being set up there.
+"""
+
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# A4 at 300 dpi, laid out 3 x 7 like common label stock.
+DPI = 300
+PAGE_SIZE = (2480, 3508)
+COLUMNS = 3
+ROWS = 7
+LABELS_PER_PAGE = COLUMNS * ROWS
+MARGIN = 60
+PADDING = 20
+FONT_SIZE = 32
+
+
+def render_page(labels):
+    """
+    Render one page of labels as PNG bytes.
+
+    labels are (QR code PNG, caption lines) pairs, at most LABELS_PER_PAGE
+    of them.  Each label has its QR code on the left and the caption beside
+    it.
+    """
+    # Imported here as Pillow is only needed to print label sheets.
+    from PIL import Image
+    from PIL import ImageDraw
+    from PIL import ImageFont
+
+    page = Image.new("L", PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    font = ImageFont.load_default(size=FONT_SIZE)
+    cell_width = (PAGE_SIZE[0] - 2 * MARGIN) // COLUMNS
+    cell_height = (PAGE_SIZE[1] - 2 * MARGIN) // ROWS
+    qr_size = cell_height - 2 * PADDING
+    text_width = cell_width - qr_size - 3 * PADDING
+    for i, (qr_code, lines) in enumerate(labels):
+        left = MARGIN + (i % COLUMNS) * cell_width
+        top = MARGIN + (i // COLUMNS) * cell_height
+        with Image.open(io.BytesIO(qr_code)) as image:
+            # Nearest neighbour keeps the modules sharp for scanners.
+            qr = image.convert("L").resize(
+                (qr_size, qr_size),
+                Image.Resampling.NEAREST,
+            )
+        page.paste(qr, (left + PADDING, top + PADDING))
+        draw.multiline_text(
+            (left + qr_size + 2 * PADDING, top + PADDING),
+            "\n".join(_fit(draw, line, font, text_width) for line in lines),
+            fill=0,
+            font=font,
+            spacing=PADDING,
+        )
+    buffer = io.BytesIO()
+    page.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def render_sheet(labels, fp, workers=None):
+    """
+    Write labels to fp as a PDF and return its number of pages.
+
+    Pages are rendered in parallel by up to workers processes, and appended
+    to the PDF one at a time so only a single page is held in memory here.
+    They are rendered in this process instead when workers is 1, or when
+    this process is daemonic and so may not start a pool.
+    """
+    # Imported here as Pillow is only needed to print label sheets.
+    from PIL import Image
+
+    pages = [
+        labels[i : i + LABELS_PER_PAGE] for i in range(0, len(labels), LABELS_PER_PAGE)
+    ]
+    with _executor(workers) as executor:
+        page_count = 0
+        for png in executor.map(render_page, pages):
+            with Image.open(io.BytesIO(png)) as page:
+                page.save(fp, "PDF", resolution=DPI, append=page_count > 0)
+            page_count += 1
+    return page_count
+
+
+def _executor(workers):
+    # Celery's prefork workers are daemonic processes, which are not allowed
+    # to have children.
+    if workers == 1 or multiprocessing.current_process().daemon:
+        return _InProcessExecutor()
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+class _InProcessExecutor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, fn, iterable):
+        return map(fn, iterable)
+
+
+def _fit(draw, text, font, width):
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
@@ -0,0 +1,116 @@
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from qr_code.qrcode.maker import make_qr_code_image
+from qr_code.qrcode.utils import QRCodeOptions
+from shortener import shortener
+from shortener.models import UrlMap
+
+from .label_sheets import render_sheet
+from .models import AssetLabel
+from .models import LabelSheet
+
+QR_CODE_OPTIONS = QRCodeOptions(image_format="png", size=5)
+# Processes rendering a label sheet's pages, by default one per CPU.  Sheets
+# rendered in a daemonic process, such as a Celery prefork worker, are
+# always rendered in that process.
+LABEL_SHEET_WORKERS = getattr(settings, "TRAKSET_LABEL_SHEET_WORKERS", None)
+# Where scanned labels lead.  Taken from settings rather than the request,
+# whose Host header the client controls.
+LABEL_BASE_URL = (
+    getattr(settings, "TRAKSET_LABEL_BASE_URL", "http://localhost:8000").rstrip("/")
+    + "/"
+)
+LABEL_FIELDS = ["url", "short_url", "qr_code", "expires_at", "last_updated"]
+
+
+def asset_label_url(base_url, asset):
+    """The transfer page that scanning asset's tag opens."""
+    return base_url + f"trakset/assets/transfer/{asset.unique_id}/"
+
+
+def is_current(asset, url, now):
+    try:
+        label = asset.label
+    except AssetLabel.DoesNotExist:
+        return False
+    return (
+        label is not None
+        and label.url == url
+        and (label.expires_at is None or label.expires_at > now)
+    )
+
+
+def refresh_asset_labels(assets, base_url, user):
+    """
+    Make labels for the assets whose label is missing, expired or out of date.
+
+    assets are Asset instances, ideally with their label selected.  Short
+    links are created as user.  Each new label is set on its asset, and the
+    number made is returned.
+    """
+    now = timezone.now()
+    stale = [
+        (asset, url)
+        for asset in assets
+        if not is_current(asset, url := asset_label_url(base_url, asset), now)
+    ]
+    if not stale:
+        return 0
+    codes = {
+        asset.pk: str(shortener.get_or_create(user, url, refresh=True))
+        for asset, url in stale
+    }
+    expiry = dict(
+        UrlMap.objects.filter(short_url__in=codes.values()).values_list(
+            "short_url",
+            "date_expired",
+        ),
+    )
+    labels = []
+    for asset, url in stale:
+        short_url = f"{base_url}s/{codes[asset.pk]}"
+        labels.append(
+            AssetLabel(
+                asset_id=asset.pk,
+                url=url,
+                short_url=short_url,
+                qr_code=make_qr_code_image(short_url, QR_CODE_OPTIONS),
+                expires_at=expiry.get(codes[asset.pk]),
+            ),
+        )
+    AssetLabel.objects.bulk_create(
+        labels,
+        update_conflicts=True,
+        unique_fields=["asset_id"],
+        update_fields=LABEL_FIELDS,
+    )
+    for (asset, _), label in zip(stale, labels, strict=True):
+        asset.label = label
+    return len(labels)
+
+
+def label_caption(asset):
+    """The lines printed beside an asset's QR code."""
+    identifiers = [asset.serial_number, asset.security_tag_number]
+    return [asset.name, " / ".join(str(value) for value in identifiers if value)]
+
+
+def render_label_sheet(sheet, workers=LABEL_SHEET_WORKERS):
+    """
+    Render the sheet's assets to a PDF and store it as the sheet's file.
+
+    Assets without a current label get one first, created as the user who
+    requested the sheet.
+    """
+    assets = list(sheet.assets.select_related("label").order_by("name", "pk"))
+    refresh_asset_labels(assets, sheet.base_url, sheet.requested_by)
+    labels = [(bytes(asset.label.qr_code), label_caption(asset)) for asset in assets]
+    with tempfile.TemporaryFile() as fp:
+        sheet.page_count = render_sheet(labels, fp, workers)
+        fp.seek(0)
+        sheet.file.save(f"labels-{sheet.pk}.pdf", File(fp), save=False)
+    sheet.status = LabelSheet.Status.DONE
+    sheet.save(update_fields=["file", "page_count", "status", "last_updated"])
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trakset.outbox import drain
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish queued outbox messages to the Celery broker.  Runs until "
+        "interrupted unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of messages claimed per transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the outbox once and exit.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            published = drain(batch_size=options["batch_size"])
+            if published:
+                self.stdout.write(f"Published {published} outbox messages.")
+            if options["once"]:
+                return
+            if not published:
+                time.sleep(options["interval"])
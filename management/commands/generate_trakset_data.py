@@ -0,0 +1,371 @@
+import contextlib
+import datetime
+import io
+import random
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from trakset.caching import bump_search_generation
+from trakset.models import Asset
+from trakset.models import AssetTransfer
+from trakset.models import AssetTransferNotes
+from trakset.models import AssetType
+from trakset.models import Location
+from trakset.models import Status
+from trakset.search import update_search_vectors
+from trakset.state import refresh_asset_states
+from trakset_app.users.models import User
+
+# Transfers and notes are flushed once this many are pending, so that very
+# popular assets do not hold millions of rows in memory.
+FLUSH_ROWS = 50_000
+STATUSES = ("In use", "Spare", "In repair", "Lost", "Retired")
+ASSET_NAMES = (
+    "Laptop",
+    "Monitor",
+    "Cordless drill",
+    "Radio",
+    "Van keys",
+    "Projector",
+    "Tablet",
+    "Camera",
+    "Ladder",
+    "First aid kit",
+)
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Let generated rows keep their own created_at and last_updated values."""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags, strict=True):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic, production sized trakset dataset for load "
+        "and performance testing.  Rows are written in chunks with COPY on "
+        "PostgreSQL and bulk_create elsewhere."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--assets", type=int, default=500_000)
+        parser.add_argument(
+            "--transfers",
+            type=int,
+            default=20_000_000,
+            help="Total number of asset transfers to generate.",
+        )
+        parser.add_argument("--users", type=int, default=2_000)
+        parser.add_argument("--locations", type=int, default=200)
+        parser.add_argument("--asset-types", type=int, default=50)
+        parser.add_argument(
+            "--distribution",
+            choices=("uniform", "zipf"),
+            default="zipf",
+            help="How transfers are spread across assets.",
+        )
+        parser.add_argument(
+            "--zipf-exponent",
+            type=float,
+            default=1.1,
+            help="Skew of the zipf distribution; higher is more skewed.",
+        )
+        parser.add_argument(
+            "--max-subscribers",
+            type=int,
+            default=5,
+            help="Maximum users emailed on transfer per asset.",
+        )
+        parser.add_argument(
+            "--notes-ratio",
+            type=float,
+            default=0.3,
+            help="Fraction of transfers that have notes.",
+        )
+        parser.add_argument(
+            "--deleted-ratio",
+            type=float,
+            default=0.05,
+            help="Fraction of assets and transfers that are soft deleted.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=730,
+            help="Number of days of history to spread the transfers over.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1_000,
+            help="Number of assets, with their transfers, written per transaction.",
+        )
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Use bulk_create even when COPY is available.",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+        self.options = options
+        self.end = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.end - datetime.timedelta(days=options["days"])
+
+        users = self.create_users(options["users"])
+        locations = self.create_named(Location, "Site", options["locations"])
+        asset_types = self.create_named(AssetType, "Type", options["asset_types"])
+        statuses = [
+            Status.global_objects.get_or_create(status_type=status_type)[0]
+            for status_type in STATUSES
+        ]
+        transfer_counts = self.transfer_counts(
+            options["assets"],
+            options["transfers"],
+        )
+
+        next_asset_id = (Asset.global_objects.aggregate(Max("id"))["id__max"] or 0) + 1
+        next_tag = (
+            Asset.global_objects.aggregate(Max("security_tag_number"))[
+                "security_tag_number__max"
+            ]
+            or 0
+        ) + 1
+        chunk_size = options["chunk_size"]
+        with explicit_timestamps(Asset, AssetTransfer, AssetTransferNotes):
+            for offset in range(0, options["assets"], chunk_size):
+                counts = transfer_counts[offset : offset + chunk_size]
+                with transaction.atomic():
+                    self.write_chunk(
+                        first_id=next_asset_id + offset,
+                        first_tag=next_tag + offset,
+                        counts=counts,
+                        users=users,
+                        locations=locations,
+                        asset_types=asset_types,
+                        statuses=statuses,
+                    )
+                self.stdout.write(
+                    f"Generated {offset + len(counts)}/{options['assets']} assets.",
+                )
+        self.reset_sequences(Asset, AssetTransferNotes)
+        bump_search_generation()
+        self.stdout.write(self.style.SUCCESS("Finished generating trakset data."))
+
+    def create_users(self, count):
+        """Create the pool of users that hold and subscribe to assets."""
+        usernames = [f"loadtest_user_{i}" for i in range(count)]
+        User.objects.bulk_create(
+            [
+                User(username=username, email=f"{username}@example.com")
+                for username in usernames
+            ],
+            ignore_conflicts=True,
+            batch_size=5_000,
+        )
+        return list(
+            User.objects.filter(username__in=usernames)
+            .order_by("username")
+            .values_list("pk", flat=True),
+        )
+
+    def create_named(self, model, prefix, count):
+        names = [f"{prefix} {i}" for i in range(count)]
+        existing = set(
+            model.global_objects.filter(name__in=names).values_list("name", flat=True),
+        )
+        model.objects.bulk_create(
+            [model(name=name) for name in names if name not in existing],
+        )
+        # Ordered, so the same --seed picks the same rows.
+        return list(
+            model.global_objects.filter(name__in=names)
+            .order_by("pk")
+            .values_list("pk", flat=True),
+        )
+
+    def transfer_counts(self, assets, transfers):
+        """Split the total number of transfers between the assets."""
+        if self.options["distribution"] == "uniform":
+            weights = [1.0] * assets
+        else:
+            exponent = self.options["zipf_exponent"]
+            weights = [1.0 / (rank**exponent) for rank in range(1, assets + 1)]
+            self.rng.shuffle(weights)
+        total = sum(weights)
+        counts = [int(transfers * weight / total) for weight in weights]
+        for i in self.rng.sample(range(assets), k=min(assets, transfers - sum(counts))):
+            counts[i] += 1
+        return counts
+
+    def random_uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def random_time(self, start):
+        span = (self.end - start).total_seconds()
+        return start + datetime.timedelta(seconds=int(self.rng.random() * span))
+
+    def write_chunk(
+        self,
+        first_id,
+        first_tag,
+        counts,
+        users,
+        locations,
+        asset_types,
+        statuses,
+    ):
+        rng = self.rng
+        deleted_ratio = self.options["deleted_ratio"]
+        assets = []
+        asset_transfers = []
+        notes = []
+        subscriptions = []
+        for i, count in enumerate(counts):
+            created_at = self.random_time(self.start)
+            holder = rng.choice(users)
+            asset = Asset(
+                id=first_id + i,
+                unique_id=self.random_uuid(),
+                created_at=created_at,
+                name=f"{rng.choice(ASSET_NAMES)} {first_id + i}",
+                description=f"Generated asset {first_id + i} for load testing.",
+                serial_number=f"SN-{rng.getrandbits(40):012X}",
+                security_tag_number=first_tag + i,
+                asset_type_id=rng.choice(asset_types),
+                status_id=rng.choice(statuses).pk,
+                location_id=rng.choice(locations),
+                deleted_at=self.end if rng.random() < deleted_ratio else None,
+            )
+            transfer_times = sorted(self.random_time(created_at) for _ in range(count))
+            for transfer_time in transfer_times:
+                to_user = rng.choice(users)
+                asset_transfer = AssetTransfer(
+                    id=self.random_uuid(),
+                    created_at=transfer_time,
+                    last_updated=transfer_time,
+                    asset_id=asset.id,
+                    from_user_id=holder,
+                    to_user_id=to_user,
+                    deleted_at=transfer_time if rng.random() < deleted_ratio else None,
+                )
+                asset_transfers.append(asset_transfer)
+                if asset_transfer.deleted_at is None:
+                    holder = to_user
+                    asset.last_transfer_id = asset_transfer.id
+                    asset.last_updated = transfer_time
+                if rng.random() < self.options["notes_ratio"]:
+                    notes.append(
+                        AssetTransferNotes(
+                            created_at=transfer_time,
+                            text=f"Handed over by user {asset_transfer.from_user_id}.",
+                            asset_transfer_id=asset_transfer.id,
+                            deleted_at=asset_transfer.deleted_at,
+                        ),
+                    )
+                if len(asset_transfers) >= FLUSH_ROWS:
+                    self.insert(AssetTransfer, asset_transfers)
+                    self.insert(AssetTransferNotes, notes)
+                    asset_transfers, notes = [], []
+            asset.current_holder_id = holder
+            asset.last_updated = asset.last_updated or created_at
+            assets.append(asset)
+            subscriptions.extend(
+                Asset.send_user_email_on_transfer.through(
+                    asset_id=asset.id,
+                    user_id=user,
+                )
+                for user in rng.sample(
+                    users,
+                    k=rng.randint(0, min(self.options["max_subscribers"], len(users))),
+                )
+            )
+        self.insert(Asset, assets)
+        self.insert(AssetTransfer, asset_transfers)
+        self.insert(AssetTransferNotes, notes)
+        self.insert(Asset.send_user_email_on_transfer.through, subscriptions)
+        # Bulk inserts skip the signals that normally keep these current.
+        update_search_vectors([asset.id for asset in assets])
+        refresh_asset_states([asset.id for asset in assets])
+
+    def insert(self, model, objs):
+        if not objs:
+            return
+        if not self.use_copy:
+            model._base_manager.bulk_create(objs, batch_size=5_000)
+            return
+        fields = [
+            field
+            for field in model._meta.concrete_fields
+            if not (field.primary_key and getattr(objs[0], field.attname) is None)
+        ]
+        quote = connection.ops.quote_name
+        sql = "COPY {} ({}) FROM STDIN".format(
+            quote(model._meta.db_table),
+            ", ".join(quote(field.column) for field in fields),
+        )
+        rows = (
+            [
+                field.get_db_prep_save(getattr(obj, field.attname), connection)
+                for field in fields
+            ]
+            for obj in objs
+        )
+        with connection.cursor() as cursor:
+            raw_cursor = cursor.cursor
+            if hasattr(raw_cursor, "copy"):
+                # psycopg 3
+                with raw_cursor.copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            else:
+                # psycopg2
+                raw_cursor.copy_expert(sql, io.StringIO(self.copy_text(rows)))
+
+    @staticmethod
+    def copy_text(rows):
+        """Encode rows in the COPY text format."""
+
+        def encode(value):
+            if value is None:
+                return "\\N"
+            if isinstance(value, bool):
+                return "t" if value else "f"
+            return (
+                str(value)
+                .replace("\\", "\\\\")
+                .replace("\t", "\\t")
+                .replace("\n", "\\n")
+                .replace("\r", "\\r")
+            )
+
+        return "".join("\t".join(encode(value) for value in row) + "\n" for row in rows)
+
+    def reset_sequences(self, *models):
+        """Move the id sequences past the explicitly numbered rows."""
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
@@ -0,0 +1,89 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.utils import timezone
+
+from trakset.models import AssetTransferNotes
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard delete the notes drafts older versions of the transfer page "
+        "saved on every render. Drafts are unattached notes that are empty or "
+        "repeat the text of notes still attached to a transfer. Notes "
+        "detached when their transfer was cancelled are kept unless "
+        "--include-detached is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=24,
+            help="Only purge notes created more than this many hours ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of rows deleted per statement.",
+        )
+        parser.add_argument(
+            "--include-detached",
+            action="store_true",
+            help="Also purge notes detached from cancelled transfers.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report how many notes would be purged without deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(hours=options["older_than"])
+        unattached = AssetTransferNotes.global_objects.filter(
+            asset_transfer__isnull=True,
+            created_at__lt=cutoff,
+        )
+        # A draft starts out empty or as a copy of the asset's last notes, so
+        # purging one loses nothing.  Cancelling a transfer sets its notes'
+        # asset_transfer to NULL as well, and those notes may be the only
+        # copy of what was written.
+        drafts = unattached.filter(
+            Q(text="")
+            | Exists(
+                AssetTransferNotes.global_objects.filter(
+                    asset_transfer__isnull=False,
+                    text=OuterRef("text"),
+                ),
+            ),
+        )
+        orphans = unattached if options["include_detached"] else drafts
+        if options["dry_run"]:
+            draft_count = drafts.count()
+            detached_count = unattached.count() - draft_count
+            purged = draft_count
+            if options["include_detached"]:
+                purged += detached_count
+            self.stdout.write(
+                f"{draft_count} draft notes and {detached_count} detached notes "
+                f"found; {purged} would be purged.",
+            )
+            return
+        purged = 0
+        while True:
+            batch = list(
+                orphans.order_by("pk").values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ],
+            )
+            if not batch:
+                break
+            deleted, _ = AssetTransferNotes.global_objects.filter(
+                pk__in=batch,
+            ).hard_delete()
+            purged += deleted
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} orphaned notes."))
@@ -0,0 +1,292 @@
+import http.client
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import DatabaseError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from trakset.models import Asset
+from trakset_app.users.models import User
+
+CANCEL_LINK_RE = re.compile(r"/assets/transfer/([0-9a-f-]{36})/cancel/")
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class VirtualUser:
+    """One logged in member of staff scanning, cancelling and searching."""
+
+    def __init__(self, base_url, session_cookie, timeout):
+        url = urlsplit(base_url)
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connection = connection_class(url.hostname, url.port, timeout=timeout)
+        self.host = url.netloc
+        # Django's CSRF check wants an HTTPS Referer from the same origin.
+        self.origin = f"{url.scheme}://{url.netloc}"
+        self.cookies = {settings.SESSION_COOKIE_NAME: session_cookie}
+        self.transfer_ids = []
+
+    def request(self, method, path, body=None):
+        headers = {
+            "Host": self.host,
+            "Cookie": "; ".join(
+                f"{name}={value}" for name, value in self.cookies.items()
+            ),
+        }
+        if body is not None:
+            body = urlencode(body)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["Referer"] = f"{self.origin}{path}"
+            headers["X-CSRFToken"] = self.cookies.get(settings.CSRF_COOKIE_NAME, "")
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read().decode(errors="replace")
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            raise
+        for header in response.headers.get_all("Set-Cookie") or []:
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return response.status, content
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a scan storm against a running trakset server: many logged in "
+        "virtual users scanning tags, cancelling transfers and searching at "
+        "once.  Reports latency percentiles, throughput, error rates and, on "
+        "PostgreSQL, the number of database queries the server ran."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            default="http://127.0.0.1:8000",
+            help="Address of the server under test.",
+        )
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=30.0,
+            help="Seconds to run the storm for.",
+        )
+        parser.add_argument(
+            "--assets",
+            type=int,
+            default=200,
+            help="Number of assets the virtual users scan between them.",
+        )
+        parser.add_argument(
+            "--mix",
+            default="transfer=80,cancel=5,search=15",
+            help="Relative weights of the transfer, cancel and search actions.",
+        )
+        parser.add_argument(
+            "--think-time",
+            type=float,
+            default=0.0,
+            help="Seconds each virtual user waits between requests.",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options["mix"])
+        assets = list(
+            Asset.objects.order_by("pk").values_list("unique_id", "name")[
+                : options["assets"]
+            ],
+        )
+        if not assets:
+            msg = "There are no assets to scan; run generate_trakset_data first."
+            raise CommandError(msg)
+        session_cookies = self.log_in(options["users"])
+        rng = random.Random(options["seed"])
+        seeds = [rng.getrandbits(32) for _ in session_cookies]
+
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        queries_before = self.query_totals()
+        started = time.perf_counter()
+        deadline = started + options["duration"]
+        with ThreadPoolExecutor(max_workers=len(session_cookies)) as executor:
+            for session_cookie, seed in zip(session_cookies, seeds, strict=True):
+                executor.submit(
+                    self.run_user,
+                    VirtualUser(
+                        options["base_url"],
+                        session_cookie,
+                        options["timeout"],
+                    ),
+                    random.Random(seed),
+                    assets,
+                    mix,
+                    deadline,
+                    options["think_time"],
+                )
+        elapsed = time.perf_counter() - started
+        # pg_stat counters are flushed by the server processes asynchronously.
+        time.sleep(1)
+        queries_after = self.query_totals()
+        self.report(elapsed, queries_before, queries_after)
+
+    def parse_mix(self, mix):
+        weights = {}
+        for part in mix.split(","):
+            action, _, weight = part.partition("=")
+            if action not in ("transfer", "cancel", "search"):
+                msg = f"Unknown action {action!r} in --mix."
+                raise CommandError(msg)
+            weights[action] = float(weight)
+        return weights
+
+    def log_in(self, count):
+        """Create the load test users and return a session cookie for each."""
+        usernames = [f"scanstorm_user_{i}" for i in range(count)]
+        User.objects.bulk_create(
+            [
+                User(username=username, email=f"{username}@example.com", is_staff=True)
+                for username in usernames
+            ],
+            ignore_conflicts=True,
+        )
+        session_cookies = []
+        for user in User.objects.filter(username__in=usernames):
+            client = Client()
+            client.force_login(user)
+            session_cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return session_cookies
+
+    def run_user(self, user, rng, assets, mix, deadline, think_time):
+        actions = list(mix)
+        weights = [mix[action] for action in actions]
+        while time.perf_counter() < deadline:
+            action = rng.choices(actions, weights)[0]
+            if action == "transfer":
+                unique_id, _ = rng.choice(assets)
+                _, content = self.timed(
+                    "asset_transfer",
+                    user,
+                    "GET",
+                    reverse("trakset:asset_transfer", args=[unique_id]),
+                )
+                user.transfer_ids.extend(CANCEL_LINK_RE.findall(content or ""))
+            elif action == "cancel" and user.transfer_ids:
+                url = reverse(
+                    "trakset:asset_transfer_cancel",
+                    args=[user.transfer_ids.pop()],
+                )
+                _, content = self.timed("asset_transfer_cancel", user, "GET", url)
+                token = CSRF_TOKEN_RE.search(content or "")
+                if token:
+                    self.timed(
+                        "asset_transfer_cancel POST",
+                        user,
+                        "POST",
+                        url,
+                        {"csrfmiddlewaretoken": token.group(1)},
+                    )
+            elif action == "search":
+                _, name = rng.choice(assets)
+                query = urlencode(
+                    {
+                        "search": name[: max(3, len(name) // 2)],
+                        "search_type": rng.choice(("assets", "transfers")),
+                    },
+                )
+                self.timed(
+                    "asset_search",
+                    user,
+                    "GET",
+                    f"{reverse('trakset:asset_search')}?{query}",
+                )
+            if think_time:
+                time.sleep(think_time)
+
+    def timed(self, name, user, method, path, body=None):
+        start = time.perf_counter()
+        try:
+            status, content = user.request(method, path, body)
+        except (OSError, http.client.HTTPException):
+            status, content = None, None
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if status is None or status >= 400:
+                self.errors[name] += 1
+        return status, content
+
+    def query_totals(self):
+        """Return the server's query count so far, or None if unavailable."""
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    "SELECT sum(calls) FROM pg_stat_statements s "
+                    "JOIN pg_database d ON d.oid = s.dbid "
+                    "WHERE d.datname = current_database()",
+                )
+                return ("queries", int(cursor.fetchone()[0] or 0))
+            except DatabaseError:
+                # pg_stat_statements is not installed, so count transactions.
+                pass
+            cursor.execute(
+                "SELECT xact_commit + xact_rollback FROM pg_stat_database "
+                "WHERE datname = current_database()",
+            )
+            return ("transactions", int(cursor.fetchone()[0]))
+
+    def percentiles(self, latencies):
+        """The 1st to 99th percentiles of latencies."""
+        if len(latencies) < 2:
+            # quantiles() needs two data points.
+            return latencies * 99
+        return statistics.quantiles(latencies, n=100, method="inclusive")
+
+    def report(self, elapsed, queries_before, queries_after):
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        self.stdout.write(
+            f"{'endpoint':<28}{'requests':>10}{'errors':>8}{'error %':>9}"
+            f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}",
+        )
+        for name, latencies in sorted(self.latencies.items()):
+            percentiles = self.percentiles(latencies)
+            errors = self.errors[name]
+            self.stdout.write(
+                f"{name:<28}{len(latencies):>10}{errors:>8}"
+                f"{100 * errors / len(latencies):>9.1f}"
+                f"{1000 * percentiles[49]:>9.1f}{1000 * percentiles[94]:>9.1f}"
+                f"{1000 * percentiles[98]:>9.1f}{len(latencies) / elapsed:>9.1f}",
+            )
+        self.stdout.write(
+            f"\n{total} requests in {elapsed:.1f}s, {total / elapsed:.1f} req/s, "
+            f"{sum(self.errors.values())} errors.",
+        )
+        if queries_before is None:
+            self.stdout.write("Database query totals are only available on PostgreSQL.")
+            return
+        kind, count = queries_after[0], queries_after[1] - queries_before[1]
+        per_request = count / total if total else 0
+        self.stdout.write(
+            f"Database {kind}: {count} in total, {per_request:.1f} per request.",
+        )
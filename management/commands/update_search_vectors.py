@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db import transaction
+
+from trakset.models import Asset
+from trakset.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored full-text search vector of every asset.  Run "
+        "this once after migrating, and after bulk loads that bypass model "
+        "signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of assets updated per transaction.",
+        )
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only update assets that have no search vector yet.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            msg = "Full-text search vectors are only stored on PostgreSQL."
+            raise CommandError(msg)
+        assets = Asset.global_objects.order_by("pk")
+        if options["missing_only"]:
+            assets = assets.filter(search_vector__isnull=True)
+        updated = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                assets.filter(pk__gt=last_pk).values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ],
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += update_search_vectors(batch)
+            last_pk = batch[-1]
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated {updated} asset search vectors."),
+        )
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Finds each asset's latest transfer for the backfill below, and pages
+# through an asset's history by (created_at, id).
+LATEST_TRANSFER_INDEX = models.Index(fields=['asset', 'created_at', 'id'], name='trakset_transfer_asset_key_idx')
+
+
+def add_latest_transfer_index(apps, schema_editor):
+    AssetTransfer = apps.get_model("trakset", "AssetTransfer")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.add_index(AssetTransfer, LATEST_TRANSFER_INDEX, concurrently=True)
+    else:
+        schema_editor.add_index(AssetTransfer, LATEST_TRANSFER_INDEX)
+
+
+def remove_latest_transfer_index(apps, schema_editor):
+    AssetTransfer = apps.get_model("trakset", "AssetTransfer")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.remove_index(AssetTransfer, LATEST_TRANSFER_INDEX, concurrently=True)
+    else:
+        schema_editor.remove_index(AssetTransfer, LATEST_TRANSFER_INDEX)
+
+
+def set_last_transfer(apps, schema_editor):
+    Asset = apps.get_model("trakset", "Asset")
+    AssetTransfer = apps.get_model("trakset", "AssetTransfer")
+    latest = AssetTransfer.objects.filter(
+        asset=models.OuterRef("pk"),
+        deleted_at__isnull=True,
+    ).order_by("-created_at")
+    Asset.objects.update(last_transfer=models.Subquery(latest.values("pk")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('trakset', '0043_assettransfernotes_deleted_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='last_transfer',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='trakset.assettransfer', verbose_name='Last Transfer'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='assettransfer', index=LATEST_TRANSFER_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(add_latest_transfer_index, remove_latest_transfer_index),
+            ],
+        ),
+        migrations.RunPython(set_last_transfer, migrations.RunPython.noop, atomic=True),
+    ]
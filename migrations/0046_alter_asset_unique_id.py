@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:51
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakset', '0045_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='asset',
+            name='unique_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
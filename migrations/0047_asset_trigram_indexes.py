@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:55
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    django.contrib.postgres.indexes.GinIndex(fields=['name'], name='trakset_asset_name_trgm_idx', opclasses=['gin_trgm_ops']),
+    django.contrib.postgres.indexes.GinIndex(fields=['serial_number'], name='trakset_asset_serial_trgm_idx', opclasses=['gin_trgm_ops']),
+    django.contrib.postgres.indexes.GinIndex(fields=['description'], name='trakset_asset_desc_trgm_idx', opclasses=['gin_trgm_ops']),
+]
+
+
+def add_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    Asset = apps.get_model("trakset", "Asset")
+    for index in TRIGRAM_INDEXES:
+        schema_editor.add_index(Asset, index, concurrently=True)
+
+
+def remove_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Asset = apps.get_model("trakset", "Asset")
+    for index in TRIGRAM_INDEXES:
+        schema_editor.remove_index(Asset, index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('trakset', '0046_alter_asset_unique_id'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='asset', index=index)
+                for index in TRIGRAM_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_trigram_indexes, remove_trigram_indexes),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:10
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='trakset_asset_search_idx')
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Asset = apps.get_model("trakset", "Asset")
+    schema_editor.add_index(Asset, SEARCH_INDEX, concurrently=True)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Asset = apps.get_model("trakset", "Asset")
+    schema_editor.remove_index(Asset, SEARCH_INDEX, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.  Existing
+    # assets are indexed with the update_search_vectors command.
+    atomic = False
+
+    dependencies = [
+        ('trakset', '0047_asset_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='asset', index=SEARCH_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(add_search_index, remove_search_index),
+            ],
+        ),
+    ]
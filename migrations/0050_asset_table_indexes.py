@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE_INDEXES = [
+    models.Index(fields=['name', 'id'], name='trakset_asset_name_idx'),
+    models.Index(fields=['created_at', 'id'], name='trakset_asset_created_idx'),
+]
+
+
+def add_table_indexes(apps, schema_editor):
+    Asset = apps.get_model("trakset", "Asset")
+    concurrently = schema_editor.connection.vendor == "postgresql"
+    for index in TABLE_INDEXES:
+        if concurrently:
+            schema_editor.add_index(Asset, index, concurrently=True)
+        else:
+            schema_editor.add_index(Asset, index)
+
+
+def remove_table_indexes(apps, schema_editor):
+    Asset = apps.get_model("trakset", "Asset")
+    concurrently = schema_editor.connection.vendor == "postgresql"
+    for index in TABLE_INDEXES:
+        if concurrently:
+            schema_editor.remove_index(Asset, index, concurrently=True)
+        else:
+            schema_editor.remove_index(Asset, index)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('trakset', '0048_asset_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='asset', index=index)
+                for index in TABLE_INDEXES
+            ],
+            database_operations=[
+                migrations.RunPython(add_table_indexes, remove_table_indexes),
+            ],
+        ),
+    ]
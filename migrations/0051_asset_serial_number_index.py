@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+SERIAL_INDEX = models.Index(fields=['serial_number'], name='trakset_asset_serial_idx')
+
+
+def add_serial_index(apps, schema_editor):
+    Asset = apps.get_model("trakset", "Asset")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.add_index(Asset, SERIAL_INDEX, concurrently=True)
+    else:
+        schema_editor.add_index(Asset, SERIAL_INDEX)
+
+
+def remove_serial_index(apps, schema_editor):
+    Asset = apps.get_model("trakset", "Asset")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.remove_index(Asset, SERIAL_INDEX, concurrently=True)
+    else:
+        schema_editor.remove_index(Asset, SERIAL_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('trakset', '0050_asset_table_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name='asset', index=SERIAL_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(add_serial_index, remove_serial_index),
+            ],
+        ),
+    ]
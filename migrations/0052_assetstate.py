@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_asset_states(apps, schema_editor):
+    """Fill the table with one INSERT ... SELECT, which every backend runs."""
+    Asset = apps.get_model("trakset", "Asset")
+    AssetState = apps.get_model("trakset", "AssetState")
+    AssetTransfer = apps.get_model("trakset", "AssetTransfer")
+    AssetType = apps.get_model("trakset", "AssetType")
+    Location = apps.get_model("trakset", "Location")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"""
+        INSERT INTO {quote(AssetState._meta.db_table)} (
+            asset_id, holder_username, location_name, asset_type_name,
+            status_type, last_transfer_at, transfer_count, is_deleted
+        )
+        SELECT
+            a.id, u.{quote(User._meta.get_field("username").column)}, l.name,
+            t.name, a.status_id,
+            lt.created_at,
+            (
+                SELECT COUNT(*) FROM {quote(AssetTransfer._meta.db_table)} x
+                WHERE x.asset_id = a.id AND x.deleted_at IS NULL
+            ),
+            a.deleted_at IS NOT NULL
+        FROM {quote(Asset._meta.db_table)} a
+        LEFT JOIN {quote(User._meta.db_table)} u ON u.id = a.current_holder_id
+        LEFT JOIN {quote(Location._meta.db_table)} l ON l.id = a.location_id
+        LEFT JOIN {quote(AssetType._meta.db_table)} t ON t.id = a.asset_type_id
+        LEFT JOIN {quote(AssetTransfer._meta.db_table)} lt
+            ON lt.id = a.last_transfer_id
+        """,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakset', '0051_asset_serial_number_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetState',
+            fields=[
+                ('asset_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('holder_username', models.CharField(blank=True, max_length=150, null=True)),
+                ('location_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('asset_type_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('status_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('last_transfer_at', models.DateTimeField(blank=True, null=True)),
+                ('transfer_count', models.PositiveIntegerField(default=0)),
+                ('is_deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Asset State',
+                'verbose_name_plural': 'Asset States',
+            },
+        ),
+        # A ForeignObject has no column of its own.  Leaving it out of the
+        # database operations also keeps SQLite from rebuilding the table
+        # for it when migrating backwards.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='asset',
+                    name='state',
+                    field=models.ForeignObject(from_fields=['id'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='trakset.assetstate', to_fields=['asset_id']),
+                ),
+            ],
+        ),
+        migrations.RunPython(backfill_asset_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trakset', '0052_assetstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetLabel',
+            fields=[
+                ('asset_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('url', models.URLField(max_length=500, verbose_name='Transfer URL')),
+                ('short_url', models.URLField(max_length=255, verbose_name='Short URL')),
+                ('qr_code', models.BinaryField(verbose_name='QR code PNG')),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Asset Label',
+                'verbose_name_plural': 'Asset Labels',
+            },
+        ),
+        # As Asset.state in 0052, Asset.label has no column of its own.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='asset',
+                    name='label',
+                    field=models.ForeignObject(from_fields=['id'], null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='trakset.assetlabel', to_fields=['asset_id']),
+                ),
+            ],
+        ),
+    ]
@@ -2,6 +2,9 @@ import datetime
 import uuid
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
@@ -104,7 +107,7 @@ def get_admin_for_default():
 class Asset(SoftDeleteModel):
     # Fields
     id = models.AutoField(primary_key=True, unique=True)
-    unique_id = models.UUIDField(default=uuid.uuid4, editable=False)
+    unique_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     last_updated = models.DateTimeField(auto_now=True, editable=False)
     send_user_email_on_transfer = models.ManyToManyField(
@@ -150,9 +153,64 @@ class Asset(SoftDeleteModel):
         related_name="asset_locations",
         verbose_name="Asset Location",
     )
+    last_transfer = models.ForeignKey(
+        "AssetTransfer",
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        verbose_name="Last Transfer",
+    )
+    # Kept up to date by trakset.search.update_search_vectors().
+    search_vector = SearchVectorField(null=True, editable=False)
+    # The asset's AssetState row, joined on its id.  AssetState.asset_id is
+    # a plain column rather than a foreign key, so django_softdelete's
+    # delete and restore cascade does not reach the derived table.
+    state = models.ForeignObject(
+        "AssetState",
+        on_delete=models.DO_NOTHING,
+        from_fields=["id"],
+        to_fields=["asset_id"],
+        null=True,
+        related_name="+",
+    )
+    # The asset's AssetLabel row, joined the same way as state.
+    label = models.ForeignObject(
+        "AssetLabel",
+        on_delete=models.DO_NOTHING,
+        from_fields=["id"],
+        to_fields=["asset_id"],
+        null=True,
+        related_name="+",
+    )
 
     class Meta:
-        pass
+        # The GIN trigram and full-text indexes for the asset search are only
+        # created on PostgreSQL; see migrations 0047 and 0048.
+        indexes = [
+            # Orderable columns of the server-side asset table.
+            models.Index(fields=["name", "id"], name="trakset_asset_name_idx"),
+            models.Index(fields=["created_at", "id"], name="trakset_asset_created_idx"),
+            # Exact serial number lookups in the asset search.
+            models.Index(fields=["serial_number"], name="trakset_asset_serial_idx"),
+            GinIndex(fields=["search_vector"], name="trakset_asset_search_idx"),
+            GinIndex(
+                fields=["name"],
+                name="trakset_asset_name_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["serial_number"],
+                name="trakset_asset_serial_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["description"],
+                name="trakset_asset_desc_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
 
     def __str__(self):
         return str(self.name)
@@ -171,6 +229,100 @@ class AssetProxy(Asset):
         verbose_name_plural = "Assets"
 
 
+class AssetState(models.Model):
+    """
+    One denormalized row per asset with what listings show about it.
+
+    Kept current by trakset.state.refresh_asset_states() from the asset and
+    transfer write paths, so listings do not have to join five tables.
+    """
+
+    # Fields
+    asset_id = models.IntegerField(primary_key=True)
+    holder_username = models.CharField(max_length=150, null=True, blank=True)
+    location_name = models.CharField(max_length=255, null=True, blank=True)
+    asset_type_name = models.CharField(max_length=255, null=True, blank=True)
+    status_type = models.CharField(max_length=50, null=True, blank=True)
+    last_transfer_at = models.DateTimeField(null=True, blank=True)
+    transfer_count = models.PositiveIntegerField(default=0)
+    is_deleted = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Asset State"
+        verbose_name_plural = "Asset States"
+
+    def __str__(self):
+        return f"State of asset {self.asset_id}"
+
+
+class AssetLabel(models.Model):
+    """
+    The short link printed on an asset's tag and its QR code.
+
+    Made by trakset.labels.refresh_asset_labels() when the asset is saved in
+    the admin, and again only once the link expires or its target changes.
+    """
+
+    # Fields
+    asset_id = models.IntegerField(primary_key=True)
+    url = models.URLField(max_length=500, verbose_name="Transfer URL")
+    short_url = models.URLField(max_length=255, verbose_name="Short URL")
+    qr_code = models.BinaryField(verbose_name="QR code PNG")
+    expires_at = models.DateTimeField(null=True, blank=True)
+    last_updated = models.DateTimeField(auto_now=True, editable=False)
+
+    class Meta:
+        verbose_name = "Asset Label"
+        verbose_name_plural = "Asset Labels"
+
+    def __str__(self):
+        return f"Label of asset {self.asset_id}"
+
+
+class LabelSheet(models.Model):
+    """
+    A PDF of labels for a selection of assets, for printing.
+
+    Requested from the asset admin and rendered in the background by the
+    generate_label_sheet task.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    # Fields
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    last_updated = models.DateTimeField(auto_now=True, editable=False)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="label_sheets",
+        verbose_name="Requested By",
+    )
+    # Where the labels' links point, from TRAKSET_LABEL_BASE_URL.
+    base_url = models.URLField(max_length=255)
+    assets = models.ManyToManyField(Asset, related_name="label_sheets")
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    file = models.FileField(upload_to="label_sheets/", blank=True)
+    page_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        verbose_name = "Label Sheet"
+        verbose_name_plural = "Label Sheets"
+
+    def __str__(self):
+        return f"Label sheet {self.id}"
+
+
 class AssetTransfer(SoftDeleteModel):
     # Fields
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -198,6 +350,16 @@ class AssetTransfer(SoftDeleteModel):
         verbose_name="To User",
     )
 
+    class Meta:
+        indexes = [
+            # Also serves keyset pagination of an asset's history, which
+            # orders by (created_at, id).
+            models.Index(
+                fields=["asset", "created_at", "id"],
+                name="trakset_transfer_asset_key_idx",
+            ),
+        ]
+
     def __str__(self):
         name = self.asset.name if self.asset is not None else "Deleted Asset!"
         return (
@@ -233,3 +395,23 @@ class AssetTransferNotes(SoftDeleteModel):
 
     def __str__(self):
         return f"Notes {self.text:50}"
+
+
+class OutboxMessage(models.Model):
+    # Fields
+    id = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    task_name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    attempts = models.PositiveIntegerField(default=0)
+    # Failed messages are retried from this time on, with a growing delay.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set once a message has used up its attempts; drain() skips it after.
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Outbox Message"
+        verbose_name_plural = "Outbox Messages"
+
+    def __str__(self):
+        return f"{self.task_name}{tuple(self.args)}"
@@ -0,0 +1,175 @@
+import heapq
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+
+# pg_trgm's default pg_trgm.similarity_threshold and
+# pg_trgm.word_similarity_threshold, so both backends match the same assets.
+SIMILARITY_THRESHOLD = 0.3
+WORD_SIMILARITY_THRESHOLD = 0.6
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def trigrams(text):
+    """
+    Return the trigrams pg_trgm extracts from text.
+
+    Each lower-cased word is padded with two spaces in front and one behind,
+    so trigrams at the start of a word count for more.
+    """
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a, b):
+    """The share of trigrams two texts have in common, as pg_trgm's similarity()."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def word_similarity(query, text):
+    """
+    The share of query's trigrams found in text.
+
+    An upper bound on pg_trgm's word_similarity(), which also requires the
+    trigrams to come from one contiguous stretch of text.
+    """
+    if not query:
+        return 0.0
+    return len(query & text) / len(query)
+
+
+@dataclass(frozen=True)
+class Document:
+    """The trigrams of one asset's searchable fields."""
+
+    name: str
+    security_tag_number: int | None
+    name_grams: frozenset
+    serial_number_grams: frozenset
+    description_grams: frozenset
+
+    @property
+    def grams(self):
+        return self.name_grams | self.serial_number_grams | self.description_grams
+
+
+class NgramIndex:
+    """
+    Asset names, serial numbers and descriptions, indexed by trigram.
+
+    Only assets sharing a trigram with the query are scored, and scores use
+    the same functions and thresholds as the pg_trgm backend.  Safe to use
+    from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._postings = defaultdict(set)
+        self._tags = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, pk, name, serial_number, description, security_tag_number):
+        """Index an asset, replacing what was indexed for it before."""
+        document = Document(
+            name=name,
+            security_tag_number=security_tag_number,
+            name_grams=trigrams(name),
+            serial_number_grams=trigrams(serial_number or ""),
+            description_grams=trigrams(description or ""),
+        )
+        with self._lock:
+            self._remove(pk)
+            self._documents[pk] = document
+            for gram in document.grams:
+                self._postings[gram].add(pk)
+            if security_tag_number is not None:
+                self._tags[security_tag_number] = pk
+
+    def remove(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        document = self._documents.pop(pk, None)
+        if document is None:
+            return
+        for gram in document.grams:
+            self._postings[gram].discard(pk)
+            if not self._postings[gram]:
+                del self._postings[gram]
+        if self._tags.get(document.security_tag_number) == pk:
+            del self._tags[document.security_tag_number]
+
+    def search(self, text, limit=None):
+        """
+        Return the pks of assets resembling text, best first.
+
+        Like the pg_trgm backend, an asset matches on its name or serial
+        number's similarity or its description's word similarity.
+        """
+        query = trigrams(text)
+        scored = []
+        with self._lock:
+            for pk in self._candidates(query):
+                document = self._documents[pk]
+                name = similarity(document.name_grams, query)
+                serial_number = similarity(document.serial_number_grams, query)
+                description = word_similarity(query, document.description_grams)
+                if (
+                    name >= SIMILARITY_THRESHOLD
+                    or serial_number >= SIMILARITY_THRESHOLD
+                    or description >= WORD_SIMILARITY_THRESHOLD
+                ):
+                    scored.append((-max(name, serial_number, description), pk))
+        return [pk for _, pk in _best(scored, limit)]
+
+    def autocomplete(self, text, limit=None):
+        """
+        Return the pks of assets to suggest for text, best first.
+
+        A word of the name or serial number has to start like text, and a
+        number matching a security tag ranks first.
+        """
+        query = trigrams(text)
+        scored = []
+        with self._lock:
+            tagged = (
+                self._tags.get(int(text))
+                if text.isascii() and text.isdecimal()
+                else None
+            )
+            candidates = self._candidates(query)
+            for pk in candidates:
+                document = self._documents[pk]
+                score = max(
+                    word_similarity(query, document.name_grams),
+                    word_similarity(query, document.serial_number_grams),
+                )
+                if pk == tagged:
+                    score = 1.0
+                if score >= WORD_SIMILARITY_THRESHOLD:
+                    scored.append((-score, document.name, pk))
+            if tagged is not None and tagged not in candidates:
+                scored.append((-1.0, self._documents[tagged].name, tagged))
+        return [pk for *_, pk in _best(scored, limit)]
+
+    def _candidates(self, query):
+        pks = set()
+        for gram in query:
+            pks |= self._postings.get(gram, set())
+        return pks
+
+
+def _best(scored, limit):
+    if limit is None:
+        return sorted(scored)
+    return heapq.nsmallest(limit, scored)
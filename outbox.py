@@ -0,0 +1,87 @@
+import logging
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Publishing attempts before a message is given up on, and the delay before
+# the first retry, doubled after each further failure.
+MAX_ATTEMPTS = getattr(settings, "TRAKSET_OUTBOX_MAX_ATTEMPTS", 10)
+RETRY_DELAY = getattr(settings, "TRAKSET_OUTBOX_RETRY_DELAY", 30)
+
+
+def enqueue(task, *args):
+    """
+    Queue a Celery task in the outbox.
+
+    The row is written on the caller's connection, so it commits or rolls
+    back together with the surrounding transaction.  Nothing talks to the
+    broker until drain() publishes it.
+    """
+    return OutboxMessage.objects.create(task_name=task.name, args=list(args))
+
+
+async def aenqueue(task, *args):
+    """Async version of enqueue()."""
+    return await OutboxMessage.objects.acreate(task_name=task.name, args=list(args))
+
+
+def drain(batch_size=100):
+    """
+    Publish pending outbox messages to the broker, oldest first.
+
+    Each batch is claimed with SKIP LOCKED so several drain workers can run
+    side by side, and published rows are deleted in the same transaction.
+    A message that fails to publish is skipped and retried after a delay
+    that doubles each time, so it cannot hold up the ones behind it.  After
+    MAX_ATTEMPTS it is marked failed and left in the table for inspection.
+    Returns the number of messages published.
+    """
+    published_total = 0
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            batch = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(failed_at__isnull=True, next_attempt_at__lte=now)
+                .order_by("id")[:batch_size],
+            )
+            if not batch:
+                return published_total
+            published = []
+            for message in batch:
+                try:
+                    current_app.signature(
+                        message.task_name,
+                        args=message.args,
+                    ).apply_async()
+                except Exception:
+                    logger.exception("Could not publish outbox message %s", message.pk)
+                    _retry_later(message, now)
+                    continue
+                published.append(message.pk)
+            OutboxMessage.objects.filter(pk__in=published).delete()
+        published_total += len(published)
+        if len(batch) < batch_size:
+            return published_total
+
+
+def _retry_later(message, now):
+    message.attempts += 1
+    if message.attempts >= MAX_ATTEMPTS:
+        logger.error(
+            "Giving up on outbox message %s after %s attempts",
+            message.pk,
+            message.attempts,
+        )
+        message.failed_at = now
+    else:
+        delay = RETRY_DELAY * 2 ** (message.attempts - 1)
+        message.next_attempt_at = now + timedelta(seconds=delay)
+    message.save(update_fields=["attempts", "next_attempt_at", "failed_at"])
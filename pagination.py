@@ -0,0 +1,192 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import UUIDField
+from django.utils.functional import cached_property
+
+PER_PAGE = 50
+# Row counts the planner estimates above this are not counted exactly.
+ESTIMATED_COUNT_THRESHOLD = getattr(
+    settings,
+    "TRAKSET_ESTIMATED_COUNT_THRESHOLD",
+    100_000,
+)
+
+
+@dataclass(frozen=True)
+class KeysetPage:
+    """One page of a keyset paginated queryset, newest first."""
+
+    object_list: list
+    next_cursor: str | None
+    previous_cursor: str | None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(obj):
+    """
+    Return an opaque cursor for obj's (created_at, pk) position.
+
+    obj is a model instance or a values() row with created_at and pk keys.
+    """
+    if isinstance(obj, dict):
+        created_at, pk = obj["created_at"], obj["pk"]
+    else:
+        created_at, pk = obj.created_at, obj.pk
+    key = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor, pk_type=uuid.UUID):
+    """
+    Return the (created_at, pk) in a cursor, or None if it is invalid.
+
+    Cursors come from the query string, so the pk is parsed with pk_type here
+    rather than left to fail when the page's query runs.
+    """
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor).decode().split("|", 1)
+        return datetime.datetime.fromisoformat(created_at), pk_type(pk)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def cursor_pk_type(model):
+    """The type decode_cursor() parses model's primary keys as."""
+    return uuid.UUID if isinstance(model._meta.pk, UUIDField) else int
+
+
+def _page_queryset(queryset, after, before, per_page):
+    """
+    Return the sliced queryset for a page and whether it runs backwards.
+
+    Rows are ordered by (created_at, pk) so the database can seek straight
+    to the cursor through an index instead of counting past an OFFSET.
+    """
+    pk_type = cursor_pk_type(queryset.model)
+    if before and (key := decode_cursor(before, pk_type)):
+        created_at, pk = key
+        queryset = queryset.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk),
+        ).order_by("created_at", "pk")
+        return queryset[: per_page + 1], True
+    if after and (key := decode_cursor(after, pk_type)):
+        created_at, pk = key
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk),
+        )
+    return queryset.order_by("-created_at", "-pk")[: per_page + 1], False
+
+
+def _build_page(rows, backwards, after, per_page):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        return KeysetPage(
+            object_list=rows,
+            next_cursor=encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=encode_cursor(rows[0]) if has_more else None,
+        )
+    return KeysetPage(
+        object_list=rows,
+        next_cursor=encode_cursor(rows[-1]) if has_more else None,
+        previous_cursor=encode_cursor(rows[0]) if after and rows else None,
+    )
+
+
+def keyset_page(queryset, after=None, before=None, per_page=PER_PAGE):
+    """
+    Return the page of queryset after or before the given cursor.
+
+    Each page costs one query of per_page + 1 rows however deep it is.
+    """
+    page_queryset, backwards = _page_queryset(queryset, after, before, per_page)
+    return _build_page(list(page_queryset), backwards, after, per_page)
+
+
+async def akeyset_page(queryset, after=None, before=None, per_page=PER_PAGE):
+    """Async version of keyset_page()."""
+    page_queryset, backwards = _page_queryset(queryset, after, before, per_page)
+    rows = [obj async for obj in page_queryset]
+    return _build_page(rows, backwards, after, per_page)
+
+
+def estimate_count(queryset):
+    """
+    Return PostgreSQL's estimate of how many rows queryset holds.
+
+    An unfiltered queryset reads the table's pg_class.reltuples, kept by
+    ANALYZE and autovacuum.  A filtered one asks EXPLAIN for the planned row
+    count.  Returns None on other databases and for tables never analyzed.
+    """
+    if not isinstance(queryset, QuerySet):
+        return None
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+            # reltuples is -1 until the table is first analyzed.
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def aestimated_count(queryset, threshold=ESTIMATED_COUNT_THRESHOLD):
+    """
+    Return how many rows queryset holds, estimated above threshold rows.
+
+    As EstimatedCountPaginator.count, for async views.
+    """
+    estimate = await sync_to_async(estimate_count)(queryset)
+    if estimate is not None and estimate >= threshold:
+        return estimate
+    return await queryset.acount()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator that takes the planner's word for the size of large results.
+
+    An exact COUNT(*) reads every matching row, which takes seconds on tables
+    of millions of transfers.  Results estimated above estimate_threshold
+    rows use the estimate instead, so the last pages may come out short or
+    empty.  Smaller results, and databases without estimates, are counted
+    exactly.
+    """
+
+    estimate_threshold = ESTIMATED_COUNT_THRESHOLD
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate >= self.estimate_threshold:
+            return estimate
+        return super().count
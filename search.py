@@ -0,0 +1,361 @@
+import functools
+import re
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramSimilar
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import SearchQuery
+from django.contrib.postgres.search import SearchRank
+from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import TrigramSimilarity
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import F
+from django.db.models import FloatField
+from django.db.models import OuterRef
+from django.db.models import Q
+from django.db.models import Subquery
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+from .models import Asset
+from .models import AssetTransferNotes
+from .models import AssetType
+from .models import Location
+from .ngram import NgramIndex
+
+SEARCH_CONFIG = "english"
+# Largest value a PositiveIntegerField holds on every backend.
+MAX_SECURITY_TAG = 2_147_483_647
+# One word containing a digit, such as SN-00012F or 4471.
+SERIAL_NUMBER_RE = re.compile(r"[\w./-]*\d[\w./-]*")
+# How long the n-gram backend serves its index before reloading it.
+SEARCH_INDEX_MAX_AGE = getattr(settings, "TRAKSET_SEARCH_INDEX_MAX_AGE", 300)
+
+
+def exact_asset_matches(search):
+    """
+    Assets whose unique id, security tag or serial number is search.
+
+    Returns None when search does not look like an identifier.  Otherwise
+    the lookups go through unique or btree indexes, and a security tag
+    match comes before a serial number match.
+    """
+    search = search.strip()
+    try:
+        return Asset.objects.filter(unique_id=uuid.UUID(search))
+    except ValueError:
+        pass
+    if not SERIAL_NUMBER_RE.fullmatch(search):
+        return None
+    matches = Q(serial_number__in={search, search.upper()})
+    # isdigit() also accepts digits int() cannot parse, such as "²".
+    if search.isascii() and search.isdecimal() and int(search) <= MAX_SECURITY_TAG:
+        matches |= Q(security_tag_number=int(search))
+        return Asset.objects.filter(matches).order_by(
+            Case(When(security_tag_number=int(search), then=Value(0)), default=1),
+            "pk",
+        )
+    return Asset.objects.filter(matches).order_by("pk")
+
+
+class SearchBackend:
+    """
+    Fuzzy matching of assets by name, serial number and description.
+
+    queryset is always a queryset of assets, which the methods narrow down
+    and, for rank() and autocomplete(), order best first.  limit is the most
+    rows the caller reads, which a backend may use to skip the rest.
+    """
+
+    async def aprepare(self):
+        """Load anything the backend needs before it is used from async code."""
+
+    def filter(self, queryset, search):
+        raise NotImplementedError
+
+    def rank(self, queryset, search, limit=None):
+        raise NotImplementedError
+
+    def autocomplete(self, queryset, query, limit=None):
+        raise NotImplementedError
+
+    def fulltext(self, queryset, search, limit=None):
+        """
+        Assets matching search as a document, best first.
+
+        Backends without a full-text index fall back to rank().
+        """
+        return self.rank(queryset, search, limit)
+
+    def index_asset(self, asset):
+        """Pick up a saved or restored asset."""
+
+    def unindex_asset(self, pk):
+        """Forget a deleted asset."""
+
+    def reset(self):
+        """Drop any state kept outside the database."""
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Matches assets in the database through pg_trgm and its GIN indexes."""
+
+    def filter(self, queryset, search):
+        """
+        Match assets whose name, serial number or description resemble search.
+
+        The % and %> operators can use the trigram indexes, unlike a filter on
+        the computed similarity.  Their cut off is the server's
+        pg_trgm.similarity_threshold and pg_trgm.word_similarity_threshold.
+        """
+        return queryset.filter(
+            Q(TrigramSimilar(F("name"), search))
+            | Q(TrigramSimilar(F("serial_number"), search))
+            | Q(TrigramWordSimilar(F("description"), search)),
+        )
+
+    def rank(self, queryset, search, limit=None):
+        return (
+            self.filter(queryset, search)
+            .annotate(
+                similarity=Greatest(
+                    TrigramSimilarity("name", search),
+                    TrigramSimilarity("serial_number", search),
+                    TrigramWordSimilarity(search, "description"),
+                ),
+            )
+            .order_by("-similarity")
+        )
+
+    def autocomplete(self, queryset, query, limit=None):
+        """
+        Assets to suggest while query is typed, best first.
+
+        A word in the name or serial number has to start like query, which the
+        trigram indexes answer through the %> operator.  A number also matches
+        the security tag exactly, and that match ranks first.
+        """
+        matches = Q(TrigramWordSimilar(F("name"), query)) | Q(
+            TrigramWordSimilar(F("serial_number"), query),
+        )
+        similarities = [
+            TrigramWordSimilarity(query, "name"),
+            TrigramWordSimilarity(query, "serial_number"),
+        ]
+        if query.isascii() and query.isdecimal() and int(query) <= MAX_SECURITY_TAG:
+            matches |= Q(security_tag_number=int(query))
+            similarities.append(
+                Case(
+                    When(security_tag_number=int(query), then=Value(1.0)),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                ),
+            )
+        return (
+            queryset.filter(matches)
+            .annotate(similarity=Greatest(*similarities))
+            .order_by("-similarity", "name")
+        )
+
+    def fulltext(self, queryset, search, limit=None):
+        """Rank assets by their stored search vector, as websearch_to_tsquery."""
+        query = SearchQuery(search, search_type="websearch", config=SEARCH_CONFIG)
+        return (
+            queryset.filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank")
+        )
+
+
+class NgramSearchBackend(SearchBackend):
+    """
+    Matches assets against an n-gram index held in this process.
+
+    For databases without pg_trgm.  The index is loaded on first use and kept
+    up to date by this process's asset signals.  Writes made by other
+    processes, or by bulk updates that send no signals, show up once the
+    index is reloaded after max_age seconds.
+    """
+
+    def __init__(self, max_age=SEARCH_INDEX_MAX_AGE):
+        self.max_age = max_age
+        self.index = NgramIndex()
+        self._loaded_at = None
+        # Held by the one thread reloading the index.
+        self._load_lock = threading.Lock()
+        # Guards swapping the index and _pending, the changes made since the
+        # current reload started reading assets.
+        self._write_lock = threading.Lock()
+        self._pending = None
+
+    @property
+    def is_stale(self):
+        return (
+            self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+        )
+
+    def load(self):
+        """
+        Rebuild the index from every live asset.
+
+        Changes committed while the assets are read are replayed onto the new
+        index before it replaces the old one, so none of them are lost.
+        """
+        with self._write_lock:
+            self._pending = []
+        try:
+            index = NgramIndex()
+            for row in Asset.objects.values_list(
+                "pk",
+                "name",
+                "serial_number",
+                "description",
+                "security_tag_number",
+            ).iterator(chunk_size=2000):
+                index.add(*row)
+            with self._write_lock:
+                for method, args in self._pending:
+                    getattr(index, method)(*args)
+                self.index = index
+                self._loaded_at = time.monotonic()
+        finally:
+            with self._write_lock:
+                self._pending = None
+
+    def ensure_loaded(self):
+        """
+        Reload the index if it is stale, in one thread at a time.
+
+        Until the first load finishes every thread waits for it.  After that,
+        threads finding the index stale while another reloads it carry on with
+        the old one.
+        """
+        if not self.is_stale:
+            return
+        if not self._load_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self.is_stale:
+                self.load()
+        finally:
+            self._load_lock.release()
+
+    async def aprepare(self):
+        if self.is_stale:
+            await sync_to_async(self.ensure_loaded)()
+
+    def filter(self, queryset, search):
+        self.ensure_loaded()
+        return queryset.filter(pk__in=self.index.search(search))
+
+    def rank(self, queryset, search, limit=None):
+        self.ensure_loaded()
+        return _in_order(queryset, self.index.search(search, limit))
+
+    def autocomplete(self, queryset, query, limit=None):
+        self.ensure_loaded()
+        return _in_order(queryset, self.index.autocomplete(query, limit))
+
+    def index_asset(self, asset):
+        if asset.deleted_at is not None:
+            self.unindex_asset(asset.pk)
+            return
+        row = (
+            asset.pk,
+            asset.name,
+            asset.serial_number,
+            asset.description,
+            asset.security_tag_number,
+        )
+        transaction.on_commit(lambda: self._apply("add", *row))
+
+    def unindex_asset(self, pk):
+        transaction.on_commit(lambda: self._apply("remove", pk))
+
+    def _apply(self, method, *args):
+        with self._write_lock:
+            getattr(self.index, method)(*args)
+            if self._pending is not None:
+                self._pending.append((method, args))
+
+    def reset(self):
+        with self._write_lock:
+            self.index = NgramIndex()
+            self._loaded_at = None
+
+
+def _in_order(queryset, pks):
+    if not pks:
+        return queryset.none()
+    return queryset.filter(pk__in=pks).order_by(
+        Case(*(When(pk=pk, then=Value(i)) for i, pk in enumerate(pks))),
+    )
+
+
+@functools.cache
+def get_search_backend():
+    """
+    Return the search backend named by TRAKSET_SEARCH_BACKEND.
+
+    By default pg_trgm is used on PostgreSQL and the n-gram index elsewhere.
+    """
+    path = getattr(settings, "TRAKSET_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return NgramSearchBackend()
+
+
+def asset_search_vector():
+    """
+    The weighted document stored in Asset.search_vector.
+
+    Related names and notes are pulled in through subqueries, as UPDATE
+    cannot join.
+    """
+    # Imported here as it needs the PostgreSQL driver.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    notes = (
+        AssetTransferNotes.objects.filter(asset_transfer__asset=OuterRef("pk"))
+        .values("asset_transfer__asset")
+        .annotate(text=StringAgg("text", " ", distinct=True))
+        .values("text")
+    )
+    return (
+        SearchVector("name", "serial_number", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(
+            Subquery(Location.objects.filter(pk=OuterRef("location")).values("name")),
+            Subquery(
+                AssetType.objects.filter(pk=OuterRef("asset_type")).values("name"),
+            ),
+            weight="B",
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+        + SearchVector(Subquery(notes), weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(assets):
+    """
+    Recompute the stored search vector of the given assets in one UPDATE.
+
+    assets is a queryset or list of asset ids.  Full-text search is
+    PostgreSQL only, so elsewhere this does nothing.
+    """
+    if connection.vendor != "postgresql":
+        return 0
+    return Asset.global_objects.filter(pk__in=assets).update(
+        search_vector=asset_search_vector(),
+    )
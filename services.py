@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+from dataclasses import field
+
+from django.db import models
+from django.db import transaction
+from django.db.models import Exists
+from django.db.models import OuterRef
+from django.utils import timezone
+
+from .caching import bump_search_generation
+from .models import Asset
+from .models import AssetTransfer
+from .outbox import enqueue
+from .state import refresh_asset_states
+from .tasks import email_users_on_asset_transfer
+from .tasks import email_users_on_bulk_asset_transfer
+
+
+@dataclass(frozen=True)
+class TransferResult:
+    """The transfer a scan or cancel ended up with, and whether it won."""
+
+    transfer: AssetTransfer | None
+    won: bool
+
+
+@dataclass(frozen=True)
+class BulkTransferResult:
+    """The outcome of transferring a batch of assets to one user."""
+
+    transfers: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    missing: list = field(default_factory=list)
+
+
+def _lock_asset(asset_id):
+    """Lock the asset row for the rest of the current transaction."""
+    subscribers = Asset.send_user_email_on_transfer.through.objects.filter(
+        asset_id=OuterRef("pk"),
+    )
+    return (
+        Asset.global_objects.select_for_update(of=("self",))
+        .select_related("last_transfer")
+        .annotate(has_subscribers=Exists(subscribers))
+        .get(pk=asset_id)
+    )
+
+
+def transfer_asset(asset_id, to_user):
+    """
+    Transfer an asset to a user, recording the transfer in the ledger.
+
+    The holder change and the ledger insert happen in one transaction with
+    the asset row locked, so concurrent scans of the same tag serialise.
+    A scan loses if the asset was already transferred to the same user
+    within TRANSFER_TIMEOUT; the existing transfer is returned instead.
+    """
+    with transaction.atomic():
+        asset = _lock_asset(asset_id)
+        last_transfer = asset.last_transfer
+        if (
+            last_transfer is not None
+            and not last_transfer.is_deleted
+            and last_transfer.to_user_id == to_user.pk
+            and last_transfer.was_transferred_recently()
+        ):
+            return TransferResult(transfer=last_transfer, won=False)
+        asset_transfer = AssetTransfer.objects.create(
+            asset=asset,
+            from_user_id=asset.current_holder_id,
+            to_user=to_user,
+        )
+        asset.current_holder = to_user
+        asset.last_transfer = asset_transfer
+        asset.save(update_fields=["current_holder", "last_transfer", "last_updated"])
+        if asset.has_subscribers:
+            enqueue(email_users_on_asset_transfer, asset_transfer.id)
+    return TransferResult(transfer=asset_transfer, won=True)
+
+
+def cancel_transfer(transfer_id):
+    """
+    Cancel a transfer, handing the asset back to the previous holder.
+
+    The holder is only reverted if the cancelled transfer is still the
+    asset's latest one; cancelling an older transfer just removes it from
+    the ledger.  A cancel loses if the transfer has already been cancelled,
+    or no longer exists, in which case the result has no transfer.
+    """
+    asset_id = (
+        AssetTransfer.global_objects.filter(pk=transfer_id)
+        .values_list("asset_id", flat=True)
+        .first()
+    )
+    with transaction.atomic():
+        asset = _lock_asset(asset_id) if asset_id is not None else None
+        asset_transfer = (
+            AssetTransfer.global_objects.select_for_update()
+            .filter(pk=transfer_id)
+            .first()
+        )
+        if asset_transfer is None:
+            return TransferResult(transfer=None, won=False)
+        if asset_transfer.is_deleted:
+            return TransferResult(transfer=asset_transfer, won=False)
+        asset_transfer.delete()
+        if asset is not None and asset.last_transfer_id == asset_transfer.pk:
+            if asset_transfer.from_user_id is not None:
+                asset.current_holder_id = asset_transfer.from_user_id
+            asset.last_transfer = asset.transfers.order_by("created_at").last()
+            asset.save(
+                update_fields=["current_holder", "last_transfer", "last_updated"],
+            )
+    return TransferResult(transfer=asset_transfer, won=True)
+
+
+def transfer_assets(unique_ids, to_user):
+    """
+    Transfer a batch of assets to a user in one transaction.
+
+    The assets are locked in primary key order, the ledger rows are written
+    with a single bulk insert and the holders are moved with a single
+    UPDATE.  Assets the user already holds are skipped, and subscribers get
+    one combined email for the whole batch.
+    """
+    unique_ids = list(dict.fromkeys(unique_ids))
+    with transaction.atomic():
+        assets = list(
+            Asset.global_objects.select_for_update(of=("self",))
+            .select_related("current_holder")
+            .filter(unique_id__in=unique_ids)
+            .order_by("pk"),
+        )
+        found = {asset.unique_id for asset in assets}
+        missing = [unique_id for unique_id in unique_ids if unique_id not in found]
+        skipped = [asset for asset in assets if asset.current_holder_id == to_user.pk]
+        asset_transfers = AssetTransfer.objects.bulk_create(
+            [
+                AssetTransfer(
+                    asset=asset,
+                    from_user=asset.current_holder,
+                    to_user=to_user,
+                )
+                for asset in assets
+                if asset.current_holder_id != to_user.pk
+            ],
+        )
+        if asset_transfers:
+            Asset.global_objects.filter(
+                pk__in=[asset_transfer.asset_id for asset_transfer in asset_transfers],
+            ).update(
+                current_holder=to_user,
+                last_transfer=models.Case(
+                    *[
+                        models.When(
+                            pk=asset_transfer.asset_id,
+                            then=models.Value(asset_transfer.pk),
+                        )
+                        for asset_transfer in asset_transfers
+                    ],
+                    output_field=models.UUIDField(),
+                ),
+                last_updated=timezone.now(),
+            )
+            # bulk_create() and update() send no signals.
+            refresh_asset_states(
+                [asset_transfer.asset_id for asset_transfer in asset_transfers],
+            )
+            bump_search_generation()
+            enqueue(
+                email_users_on_bulk_asset_transfer,
+                [asset_transfer.pk for asset_transfer in asset_transfers],
+            )
+    return BulkTransferResult(
+        transfers=asset_transfers,
+        skipped=skipped,
+        missing=missing,
+    )
@@ -0,0 +1,190 @@
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django_softdelete.signals import post_restore
+from django_softdelete.signals import post_soft_delete
+
+from .caching import bump_search_generation
+from .caching import invalidate_asset_snapshots
+from .models import Asset
+from .models import AssetLabel
+from .models import AssetProxy
+from .models import AssetState
+from .models import AssetTransfer
+from .models import AssetTransferProxy
+from .models import AssetTransferNotes
+from .models import AssetType
+from .models import AssetTypeProxy
+from .models import Location
+from .models import LocationProxy
+from .models import Status
+from .models import StatusProxy
+from .search import get_search_backend
+from .search import update_search_vectors
+from .state import refresh_asset_states
+
+# Saves that only touch these fields come from the transfer path and do not
+# change anything held in an asset snapshot or its search vector.
+TRANSFER_FIELDS = {"current_holder", "last_transfer", "last_updated"}
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_save, sender=AssetProxy)
+def invalidate_saved_asset(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= TRANSFER_FIELDS:
+        return
+    invalidate_asset_snapshots([instance.unique_id])
+
+
+@receiver([post_delete, post_soft_delete, post_restore], sender=Asset)
+@receiver([post_delete, post_soft_delete, post_restore], sender=AssetProxy)
+def invalidate_deleted_asset(sender, instance, **kwargs):
+    invalidate_asset_snapshots([instance.unique_id])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=LocationProxy)
+def invalidate_location_assets(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    invalidate_asset_snapshots(
+        Asset.global_objects.filter(location=instance).values_list(
+            "unique_id",
+            flat=True,
+        ),
+    )
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_save, sender=AssetProxy)
+def update_saved_asset_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= TRANSFER_FIELDS:
+        return
+    update_search_vectors([instance.pk])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=LocationProxy)
+def update_location_search_vectors(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    update_search_vectors(Asset.global_objects.filter(location=instance).values("pk"))
+
+
+@receiver(post_save, sender=AssetType)
+@receiver(post_save, sender=AssetTypeProxy)
+def update_asset_type_search_vectors(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    update_search_vectors(
+        Asset.global_objects.filter(asset_type=instance).values("pk"),
+    )
+
+
+@receiver(
+    [post_save, post_delete, post_soft_delete, post_restore],
+    sender=AssetTransferNotes,
+)
+def update_notes_search_vector(sender, instance, **kwargs):
+    if instance.asset_transfer_id is None:
+        return
+    update_search_vectors(
+        AssetTransfer.global_objects.filter(pk=instance.asset_transfer_id).values(
+            "asset",
+        ),
+    )
+
+
+@receiver(post_soft_delete, sender=AssetTransfer)
+def update_cancelled_transfer_search_vector(sender, instance, **kwargs):
+    # Soft deleting a transfer detaches its notes.
+    if instance.asset_id is not None:
+        update_search_vectors([instance.asset_id])
+
+
+@receiver([post_save, post_restore], sender=Asset)
+@receiver([post_save, post_restore], sender=AssetProxy)
+def index_saved_asset(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= TRANSFER_FIELDS:
+        return
+    get_search_backend().index_asset(instance)
+
+
+@receiver([post_delete, post_soft_delete], sender=Asset)
+@receiver([post_delete, post_soft_delete], sender=AssetProxy)
+def unindex_deleted_asset(sender, instance, **kwargs):
+    get_search_backend().unindex_asset(instance.pk)
+
+
+@receiver([post_save, post_delete, post_soft_delete, post_restore], sender=Asset)
+@receiver([post_save, post_delete, post_soft_delete, post_restore], sender=AssetProxy)
+@receiver(
+    [post_save, post_delete, post_soft_delete, post_restore],
+    sender=AssetTransfer,
+)
+@receiver(
+    [post_save, post_delete, post_soft_delete, post_restore],
+    sender=AssetTransferProxy,
+)
+@receiver(
+    [post_save, post_delete, post_soft_delete, post_restore],
+    sender=AssetTransferNotes,
+)
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=LocationProxy)
+@receiver(post_save, sender=AssetType)
+@receiver(post_save, sender=AssetTypeProxy)
+def invalidate_searches(sender, **kwargs):
+    bump_search_generation()
+
+
+@receiver([post_save, post_soft_delete, post_restore], sender=Asset)
+@receiver([post_save, post_soft_delete, post_restore], sender=AssetProxy)
+def refresh_saved_asset_state(sender, instance, **kwargs):
+    refresh_asset_states([instance.pk])
+
+
+# AssetState.asset_id and AssetLabel.asset_id are not foreign keys, so
+# nothing cascades to their rows.
+@receiver(post_delete, sender=Asset)
+@receiver(post_delete, sender=AssetProxy)
+def delete_derived_asset_rows(sender, instance, **kwargs):
+    AssetState.objects.filter(asset_id=instance.pk).delete()
+    AssetLabel.objects.filter(asset_id=instance.pk).delete()
+
+
+# Creating a transfer is not handled here: the scan path saves the asset
+# straight after, which refreshes its state once with both changes.
+@receiver([post_delete, post_soft_delete, post_restore], sender=AssetTransfer)
+@receiver([post_delete, post_soft_delete, post_restore], sender=AssetTransferProxy)
+def refresh_transfer_asset_state(sender, instance, **kwargs):
+    if instance.asset_id is not None:
+        refresh_asset_states([instance.asset_id])
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=LocationProxy)
+@receiver(post_save, sender=AssetType)
+@receiver(post_save, sender=AssetTypeProxy)
+@receiver(post_save, sender=Status)
+@receiver(post_save, sender=StatusProxy)
+def refresh_related_asset_states(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    field = {Location: "location", AssetType: "asset_type", Status: "status"}[
+        sender._meta.concrete_model
+    ]
+    refresh_asset_states(
+        Asset.global_objects.filter(**{field: instance}).values("pk"),
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_holder_asset_states(sender, instance, created=False, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if created or (update_fields and "username" not in update_fields):
+        return
+    refresh_asset_states(
+        Asset.global_objects.filter(current_holder=instance).values("pk"),
+    )
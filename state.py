@@ -0,0 +1,78 @@
+from django.db.models import Count
+from django.db.models import OuterRef
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Asset
+from .models import AssetState
+from .models import AssetTransfer
+
+STATE_FIELDS = [
+    "holder_username",
+    "location_name",
+    "asset_type_name",
+    "status_type",
+    "last_transfer_at",
+    "transfer_count",
+    "is_deleted",
+]
+
+
+def refresh_asset_states(assets, batch_size=1000):
+    """
+    Recompute the AssetState rows of the given assets.
+
+    assets is a queryset or list of asset ids.  The current values are read
+    in one query and written back with an upsert per batch_size assets.
+    """
+    transfer_count = (
+        AssetTransfer.objects.filter(asset=OuterRef("pk"))
+        .order_by()
+        .values("asset")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    rows = (
+        Asset.global_objects.filter(pk__in=assets)
+        .annotate(transfer_count=Coalesce(Subquery(transfer_count), 0))
+        .values_list(
+            "pk",
+            "current_holder__username",
+            "location__name",
+            "asset_type__name",
+            "status_id",
+            "last_transfer__created_at",
+            "transfer_count",
+            "deleted_at",
+        )
+    )
+    states = [
+        AssetState(
+            asset_id=pk,
+            holder_username=holder_username,
+            location_name=location_name,
+            asset_type_name=asset_type_name,
+            status_type=status_type,
+            last_transfer_at=last_transfer_at,
+            transfer_count=count,
+            is_deleted=deleted_at is not None,
+        )
+        for (
+            pk,
+            holder_username,
+            location_name,
+            asset_type_name,
+            status_type,
+            last_transfer_at,
+            count,
+            deleted_at,
+        ) in rows
+    ]
+    AssetState.objects.bulk_create(
+        states,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["asset_id"],
+        update_fields=STATE_FIELDS,
+    )
+    return len(states)
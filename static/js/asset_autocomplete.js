@@ -0,0 +1,51 @@
+// Suggest assets in the search box's datalist while staff type, using the
+// asset_autocomplete view.  Requests are debounced and a newer keystroke
+// aborts the one in flight.
+const DEBOUNCE_MS = 150;
+const MIN_LENGTH = 2;
+
+const input = document.querySelector('[data-autocomplete-url]');
+
+if (input) {
+    const datalist = document.getElementById(input.getAttribute('list'));
+    let timer = null;
+    let controller = null;
+
+    const suggest = async () => {
+        const query = input.value.trim();
+        if (controller) {
+            controller.abort();
+        }
+        if (query.length < MIN_LENGTH) {
+            datalist.replaceChildren();
+            return;
+        }
+        controller = new AbortController();
+        const url = new URL(input.dataset.autocompleteUrl, window.location.origin);
+        url.searchParams.set('q', query);
+        try {
+            const response = await fetch(url, {signal: controller.signal});
+            if (!response.ok) {
+                return;
+            }
+            const {results} = await response.json();
+            datalist.replaceChildren(...results.map((asset) => {
+                const option = document.createElement('option');
+                option.value = asset.name;
+                option.label = [asset.serial_number, asset.security_tag_number]
+                    .filter((value) => value !== null && value !== '')
+                    .join(' / ');
+                return option;
+            }));
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                throw error;
+            }
+        }
+    };
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(suggest, DEBOUNCE_MS);
+    });
+}
@@ -1,10 +1,84 @@
 // import DataTable from './datatables.net-dt';
 // import './datatables.net-responsive-dt';
 
-let table = new DataTable('#sortableTable', {
-    responsive: true
-});
+// Tables with a data-ajax-url are sorted, filtered and paged on the server
+// by the asset_search_data view.  The first page is already in the HTML, so
+// it is not fetched again.
+//
+// Each response carries a cursor for the page after it.  Sent back as
+// "after" when that page is asked for next, it lets the server seek to the
+// page through an index instead of counting past an OFFSET.
+const element = document.querySelector('#sortableTable');
 
-$(document).ready( function () {
-    $('#sortableTable').DataTable();
-} );
+if (element && element.dataset.ajaxUrl) {
+    const extraParams = {
+        table: element.dataset.table,
+        asset: element.dataset.asset || '',
+        deleted_cb: element.dataset.deletedCb || '',
+    };
+    const pageLength = Number(element.dataset.pageLength) || 50;
+    let requested = null;
+    // The page after the last one received, and the cursor that leads to it.
+    let next = null;
+    if (element.dataset.nextCursor) {
+        next = {
+            start: pageLength,
+            length: pageLength,
+            search: '',
+            cursor: element.dataset.nextCursor,
+        };
+    }
+    new DataTable(element, {
+        responsive: true,
+        serverSide: true,
+        processing: true,
+        deferLoading: Number(element.dataset.recordsTotal),
+        pageLength: pageLength,
+        ajax: {
+            url: element.dataset.ajaxUrl,
+            data: (data) => {
+                requested = {
+                    start: data.start,
+                    length: data.length,
+                    search: data.search.value,
+                };
+                const follows = next
+                    && next.start === requested.start
+                    && next.length === requested.length
+                    && next.search === requested.search;
+                return Object.assign(
+                    data,
+                    extraParams,
+                    follows ? {after: next.cursor} : {},
+                );
+            },
+            dataSrc: (json) => {
+                next = null;
+                if (json.next_cursor) {
+                    next = {
+                        ...requested,
+                        start: requested.start + requested.length,
+                        cursor: json.next_cursor,
+                    };
+                }
+                return json.data;
+            },
+        },
+        columns: Array.from(element.querySelectorAll('thead th'), (th) => ({
+            data: th.dataset.data,
+            orderable: th.dataset.orderable === 'true',
+            render: th.dataset.data.endsWith('_at')
+                ? (value) => (value ? value.slice(0, 19).replace('T', ' ') : '')
+                : DataTable.render.text(),
+        })),
+    });
+    // The grid pages itself, so the plain links for browsers without
+    // JavaScript are not needed.
+    document.querySelectorAll('.keyset-pagination').forEach((nav) => {
+        nav.hidden = true;
+    });
+} else if (element) {
+    new DataTable(element, {
+        responsive: true
+    });
+}
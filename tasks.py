@@ -1,10 +1,55 @@
+from collections import defaultdict
+
 from celery import shared_task
+from django.core.mail import get_connection
 from django.core.mail import send_mail
 
+from trakset.labels import render_label_sheet
 from trakset.models import AssetTransfer
+from trakset.models import LabelSheet
+from trakset.outbox import drain
 from trakset_app.users.models import User
 
 
+@shared_task()
+def drain_outbox(batch_size=100):
+    """
+    Publish queued outbox messages to the broker.
+
+    Schedule this with celery beat every few seconds, or run the
+    drain_outbox management command as a dedicated worker instead.
+    """
+    return f"Published {drain(batch_size=batch_size)} outbox messages."
+
+
+@shared_task()
+def generate_label_sheet(label_sheet_id):
+    """
+    Render a label sheet requested from the asset admin.
+
+    Runs outside the request, so large selections are not cut short by a
+    request timeout.  Under Celery's prefork pool the pages are rendered in
+    the worker itself, as its daemonic processes may not start a process
+    pool of their own.
+    """
+    try:
+        sheet = LabelSheet.objects.select_related("requested_by").get(
+            id=label_sheet_id,
+        )
+    except LabelSheet.DoesNotExist:
+        return "Label sheet not found."
+    sheet.status = LabelSheet.Status.RUNNING
+    sheet.save(update_fields=["status", "last_updated"])
+    try:
+        render_label_sheet(sheet)
+    except Exception as error:
+        sheet.status = LabelSheet.Status.FAILED
+        sheet.error = str(error)
+        sheet.save(update_fields=["status", "error", "last_updated"])
+        raise
+    return f"Label sheet rendered with {sheet.page_count} pages."
+
+
 @shared_task()
 def email_admin_on_error(error_message):
     """Email the admin user when an error is encountered."""
@@ -46,3 +91,44 @@ def email_users_on_asset_transfer(asset_transfer_id):
         )
         return "Email sent to users on asset transfer."
     return "No users to email on asset transfer."
+
+
+@shared_task()
+def email_users_on_bulk_asset_transfer(asset_transfer_ids):
+    """Email each subscriber once about all their assets in a bulk transfer."""
+    asset_transfers = (
+        AssetTransfer.objects.filter(id__in=asset_transfer_ids)
+        .select_related("asset", "asset__location", "to_user")
+        .prefetch_related("asset__send_user_email_on_transfer")
+    )
+    subscriptions = defaultdict(list)
+    for asset_transfer in asset_transfers:
+        if asset_transfer.asset is None:
+            continue
+        for user in asset_transfer.asset.send_user_email_on_transfer.all():
+            if user.email:
+                subscriptions[user.email].append(asset_transfer)
+    if not subscriptions:
+        return "No users to email on bulk asset transfer."
+    connection = get_connection()
+    for email, user_transfers in subscriptions.items():
+        rows = "".join(
+            f"<li><b>{asset_transfer.asset.name}</b> based at \
+            <b>{asset_transfer.asset.location}</b>, transfer id \
+            <b>{asset_transfer.id}</b></li>"
+            for asset_transfer in user_transfers
+        )
+        to_user = user_transfers[0].to_user
+        send_mail(
+            "Assets that you are subscribed to have been transferred...",
+            "Hey from trakset!",
+            "webmaster@mindq.co.uk",
+            [email],
+            html_message=(
+                f"<html>Hi from the Mind Assets App!<br><br>The following assets \
+                have been transferred to <b>{to_user.username}</b> whose email \
+                address is <b>{to_user.email}</b>:<ul>{rows}</ul></html>"
+            ),
+            connection=connection,
+        )
+    return f"Emailed {len(subscriptions)} users on bulk asset transfer."
@@ -1 +1,1192 @@
-# Create your tests here.
+import base64
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib import admin
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
+from django.db import models
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from trakset_app.users.models import User
+
+from .caching import SEARCH_GENERATION_KEY
+from .caching import autocomplete_cache_key
+from .label_sheets import render_sheet
+from .labels import LABEL_BASE_URL
+from .labels import LABEL_SHEET_WORKERS
+from .labels import label_caption
+from .labels import refresh_asset_labels
+from .models import Asset
+from .models import AssetLabel
+from .models import AssetState
+from .models import AssetTransfer
+from .models import AssetTransferNotes
+from .models import AssetType
+from .models import LabelSheet
+from .models import Location
+from .models import OutboxMessage
+from .models import Status
+from .outbox import MAX_ATTEMPTS
+from .outbox import drain
+from .pagination import EstimatedCountPaginator
+from .pagination import decode_cursor
+from .pagination import estimate_count
+from .pagination import keyset_page
+from .ngram import NgramIndex
+from .search import NgramSearchBackend
+from .search import get_search_backend
+from .services import TransferResult
+from .services import cancel_transfer
+from .services import transfer_asset
+from .services import transfer_assets
+from .search import update_search_vectors
+from .state import refresh_asset_states
+from .tasks import email_users_on_asset_transfer
+from .tasks import email_users_on_bulk_asset_transfer
+from .tasks import generate_label_sheet
+from .urls import app_name
+from .urls import urlpatterns
+from .views import AssetAutocompleteView
+from .views import AssetTransferCancelView
+
+SEED_USERS = 20
+SEED_ASSETS = 60
+SEED_TRANSFERS_PER_ASSET = 30
+SEED_SUBSCRIBERS_PER_ASSET = 3
+# Distinct requests made of each view.
+REQUESTS_PER_VIEW = 5
+
+# The median time each view's requests took on a developer machine, in
+# seconds.  Re-record them with TRAKSET_RECORD_BASELINES=1 after making a
+# view faster or deliberately slower.
+BASELINES_PATH = Path(__file__).with_name("benchmark_baselines.json")
+RECORD_BASELINES = os.environ.get("TRAKSET_RECORD_BASELINES") == "1"
+# How much slower than its baseline a view may get before it fails, e.g. 2.0
+# lets it take three times as long.  The default leaves room for slower
+# machines than the one the baselines were recorded on.
+TIMING_TOLERANCE = float(os.environ.get("TRAKSET_TIMING_TOLERANCE", "2.0"))
+# Seconds any view may run over on top of that, for one-off costs such as
+# compiling templates when only a few tests are run.
+TIMING_GRACE = float(os.environ.get("TRAKSET_TIMING_GRACE", "0.05"))
+
+# The queries a single request runs against the seeded dataset.  Every url
+# in urls.py and every trakset admin changelist needs an entry.
+QUERY_COUNTS = {
+    "asset_bulk_transfer": 2,
+    "asset_bulk_transfer POST": 10,
+    "asset_transfer": 12,
+    "asset_transfer cached": 11,
+    "asset_transfer POST": 6,
+    "asset_transfer_cancel": 3,
+    "asset_transfer_cancel POST": 18,
+    "asset_transfer_notes_added": 0,
+    "asset_transfer_cancel_success": 0,
+    "asset_search": 4,
+    "asset_search transfers": 5,
+    "asset_search transfers history": 5,
+    "asset_search cached": 2,
+    "asset_search fulltext": 2,
+    "asset_search exact": 4,
+    "asset_search_data": 4,
+    "asset_search_data transfers": 5,
+    "asset_autocomplete": 3,
+    "asset_autocomplete cached": 2,
+    "asset_transfer_detail_view": 5,
+    "admin:trakset_assetproxy_changelist": 8,
+    "admin:trakset_assettypeproxy_changelist": 4,
+    "admin:trakset_locationproxy_changelist": 4,
+    "admin:trakset_statusproxy_changelist": 4,
+    "admin:trakset_assettransferproxy_changelist": 8,
+    "admin:trakset_labelsheet_changelist": 4,
+}
+
+
+def render_sheet_pages(labels):
+    """Render labels to a PDF and return its number of pages."""
+    return render_sheet(labels, io.BytesIO(), LABEL_SHEET_WORKERS)
+
+
+class SeededTestCase(TestCase):
+    """A test case with a realistic dataset of assets and their transfers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            "admin",
+            "admin@example.com",
+            "password",
+        )
+        cls.staff = User.objects.create_user(
+            "staff",
+            "staff@example.com",
+            "password",
+            is_staff=True,
+        )
+        users = User.objects.bulk_create(
+            [
+                User(username=f"user{i}", email=f"user{i}@example.com")
+                for i in range(SEED_USERS)
+            ],
+        )
+        locations = Location.objects.bulk_create(
+            [Location(name=f"Site {i}") for i in range(5)],
+        )
+        asset_types = AssetType.objects.bulk_create(
+            [AssetType(name=f"Type {i}") for i in range(5)],
+        )
+        statuses = Status.objects.bulk_create(
+            [Status(status_type=status) for status in ("In use", "Spare", "Broken")],
+        )
+        cls.assets = Asset.objects.bulk_create(
+            [
+                Asset(
+                    name=f"Cordless drill {i}",
+                    description=f"Drill number {i} from the tool store",
+                    serial_number=f"SN{i:06d}",
+                    security_tag_number=i + 1,
+                    current_holder=users[i % SEED_USERS],
+                    location=locations[i % len(locations)],
+                    asset_type=asset_types[i % len(asset_types)],
+                    status=statuses[i % len(statuses)],
+                )
+                for i in range(SEED_ASSETS)
+            ],
+        )
+        Asset.send_user_email_on_transfer.through.objects.bulk_create(
+            [
+                Asset.send_user_email_on_transfer.through(
+                    asset_id=asset.pk,
+                    user_id=users[(i + j) % SEED_USERS].pk,
+                )
+                for i, asset in enumerate(cls.assets)
+                for j in range(SEED_SUBSCRIBERS_PER_ASSET)
+            ],
+        )
+        transfers = AssetTransfer.objects.bulk_create(
+            [
+                AssetTransfer(
+                    asset=asset,
+                    from_user=users[(i + j) % SEED_USERS],
+                    to_user=users[(i + j + 1) % SEED_USERS],
+                    deleted_at=timezone.now() if j % 10 == 0 else None,
+                )
+                for i, asset in enumerate(cls.assets)
+                for j in range(SEED_TRANSFERS_PER_ASSET)
+            ],
+        )
+        AssetTransferNotes.objects.bulk_create(
+            [
+                AssetTransferNotes(
+                    asset_transfer=transfer,
+                    text=f"Handed over at shift change {i}",
+                )
+                for i, transfer in enumerate(transfers)
+            ],
+        )
+        Asset.objects.update(
+            last_transfer=models.Subquery(
+                AssetTransfer.objects.filter(asset=models.OuterRef("pk"))
+                .order_by("-created_at")
+                .values("pk")[:1],
+            ),
+        )
+        update_search_vectors(Asset.global_objects.values("pk"))
+        refresh_asset_states(Asset.global_objects.values("pk"))
+        cls.transfer = transfers[1]
+
+    def setUp(self):
+        cache.clear()
+        get_search_backend().reset()
+        self.client.force_login(self.admin)
+
+
+class ViewBudgetTests(SeededTestCase):
+    """The queries every trakset view runs and how long it takes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baselines = (
+            json.loads(BASELINES_PATH.read_text()) if BASELINES_PATH.exists() else {}
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        if RECORD_BASELINES:
+            BASELINES_PATH.write_text(
+                json.dumps(cls.baselines, indent=4, sort_keys=True) + "\n",
+            )
+        super().tearDownClass()
+
+    def assertBudget(self, name, requests):
+        """
+        Make the requests and check them against the view's budget.
+
+        Each request must run QUERY_COUNTS[name] queries, and their median
+        time must be within TIMING_TOLERANCE and TIMING_GRACE of the view's
+        baseline.
+        """
+        timings = []
+        for method, url, data in requests:
+            with (
+                self.subTest(name, url=url, data=data),
+                self.assertNumQueries(QUERY_COUNTS[name]),
+            ):
+                start = time.perf_counter()
+                response = getattr(self.client, method)(url, data)
+                timings.append(time.perf_counter() - start)
+                self.assertLess(response.status_code, 400)
+        elapsed = statistics.median(timings)
+        if RECORD_BASELINES:
+            self.baselines[name] = round(elapsed, 6)
+            return
+        with self.subTest(name):
+            baseline = self.baselines[name]
+            self.assertLessEqual(
+                elapsed,
+                baseline * (1 + TIMING_TOLERANCE) + TIMING_GRACE,
+                f"{name} took {elapsed * 1000:.1f}ms, over its baseline of "
+                f"{baseline * 1000:.1f}ms",
+            )
+
+    def load_search_index(self):
+        """Load the n-gram index, as an earlier request would have."""
+        self.client.get(
+            reverse("trakset:asset_search"),
+            {"search": "drill", "search_type": "assets"},
+        )
+        cache.clear()
+
+    def test_every_view_has_a_budget(self):
+        names = [pattern.name for pattern in urlpatterns] + [
+            f"admin:{app_name}_{model._meta.model_name}_changelist"
+            for model in admin.site._registry
+            if model._meta.app_label == app_name
+        ]
+        for name in names:
+            self.assertIn(name, QUERY_COUNTS)
+        if not RECORD_BASELINES:
+            self.assertEqual(set(self.baselines), set(QUERY_COUNTS))
+
+    def test_asset_transfer(self):
+        self.assertBudget(
+            "asset_transfer",
+            [
+                ("get", reverse("trakset:asset_transfer", args=[asset.unique_id]), None)
+                for asset in self.assets[:REQUESTS_PER_VIEW]
+            ],
+        )
+
+    def test_asset_transfer_cached(self):
+        urls = [
+            reverse("trakset:asset_transfer", args=[asset.unique_id])
+            for asset in self.assets[:REQUESTS_PER_VIEW]
+        ]
+        self.client.force_login(self.staff)
+        for url in urls:
+            self.client.get(url)
+        self.client.force_login(self.admin)
+        self.assertBudget("asset_transfer cached", [("get", url, None) for url in urls])
+
+    def test_asset_transfer_notes(self):
+        for asset in self.assets[:REQUESTS_PER_VIEW]:
+            self.client.get(reverse("trakset:asset_transfer", args=[asset.unique_id]))
+        self.assertBudget(
+            "asset_transfer POST",
+            [
+                (
+                    "post",
+                    reverse("trakset:asset_transfer", args=[asset.unique_id]),
+                    {"text": "Left in the van"},
+                )
+                for asset in self.assets[:REQUESTS_PER_VIEW]
+            ],
+        )
+
+    def test_asset_bulk_transfer(self):
+        url = reverse("trakset:asset_bulk_transfer")
+        self.assertBudget("asset_bulk_transfer", [("get", url, None)])
+        kit_size = SEED_ASSETS // REQUESTS_PER_VIEW
+        self.assertBudget(
+            "asset_bulk_transfer POST",
+            [
+                (
+                    "post",
+                    url,
+                    {
+                        "unique_ids": "\n".join(
+                            str(asset.unique_id)
+                            for asset in self.assets[i * kit_size : (i + 1) * kit_size]
+                        ),
+                    },
+                )
+                for i in range(REQUESTS_PER_VIEW)
+            ],
+        )
+
+    def test_asset_transfer_cancel(self):
+        url = reverse("trakset:asset_transfer_cancel", args=[self.transfer.pk])
+        self.assertBudget("asset_transfer_cancel", [("get", url, None)])
+        for asset in self.assets[:REQUESTS_PER_VIEW]:
+            self.client.get(reverse("trakset:asset_transfer", args=[asset.unique_id]))
+        self.assertBudget(
+            "asset_transfer_cancel POST",
+            [
+                (
+                    "post",
+                    reverse(
+                        "trakset:asset_transfer_cancel",
+                        args=[
+                            Asset.objects.get(pk=asset.pk).last_transfer_id,
+                        ],
+                    ),
+                    None,
+                )
+                for asset in self.assets[:REQUESTS_PER_VIEW]
+            ],
+        )
+
+    def test_asset_transfer_notes_added(self):
+        url = reverse(
+            "trakset:asset_transfer_notes_added",
+            args=[self.assets[0].unique_id],
+        )
+        self.assertBudget("asset_transfer_notes_added", [("get", url, None)])
+
+    def test_asset_transfer_cancel_success(self):
+        url = reverse(
+            "trakset:asset_transfer_cancel_success",
+            args=[self.transfer.pk, "user1"],
+        )
+        self.assertBudget("asset_transfer_cancel_success", [("get", url, None)])
+
+    def test_asset_search(self):
+        url = reverse("trakset:asset_search")
+        self.load_search_index()
+        self.assertBudget(
+            "asset_search",
+            [("get", url, {"search": "drill 7", "search_type": "assets"})],
+        )
+
+    def test_asset_search_transfers(self):
+        url = reverse("trakset:asset_search")
+        self.assertBudget(
+            "asset_search transfers",
+            [
+                (
+                    "get",
+                    url,
+                    {
+                        "search": "drill 7",
+                        "search_type": "transfers",
+                        "deleted_cb": "on",
+                    },
+                ),
+            ],
+        )
+
+    def test_asset_search_transfers_history(self):
+        url = reverse("trakset:asset_search")
+        self.assertBudget(
+            "asset_search transfers history",
+            [
+                (
+                    "get",
+                    url,
+                    {
+                        "search": "drill",
+                        "search_type": "transfers",
+                        "asset": asset.pk,
+                        "deleted_cb": "on",
+                    },
+                )
+                for asset in self.assets[:REQUESTS_PER_VIEW]
+            ],
+        )
+
+    def test_asset_search_cached(self):
+        url = reverse("trakset:asset_search")
+        params = {
+            "search": "drill",
+            "search_type": "transfers",
+            "asset": self.assets[0].pk,
+        }
+        self.client.get(url, params)
+        self.assertBudget("asset_search cached", [("get", url, params)])
+
+    def test_asset_search_exact(self):
+        url = reverse("trakset:asset_search")
+        self.assertBudget(
+            "asset_search exact",
+            [
+                ("get", url, {"search": search, "search_type": "assets"})
+                for search in (
+                    str(self.assets[1].unique_id),
+                    str(self.assets[2].security_tag_number),
+                    self.assets[3].serial_number,
+                    str(self.assets[4].unique_id),
+                    self.assets[5].serial_number,
+                )
+            ],
+        )
+
+    def test_asset_search_fulltext(self):
+        url = reverse("trakset:asset_search")
+        self.load_search_index()
+        self.assertBudget(
+            "asset_search fulltext",
+            [("get", url, {"search": "drill shift", "search_type": "fulltext"})],
+        )
+
+    def test_asset_search_data(self):
+        url = reverse("trakset:asset_search_data")
+        self.assertBudget(
+            "asset_search_data",
+            [
+                (
+                    "get",
+                    url,
+                    {
+                        "table": "assets",
+                        "draw": i,
+                        "start": i * 10,
+                        "length": 10,
+                        "order[0][column]": 1,
+                        "order[0][dir]": "desc",
+                    },
+                )
+                for i in range(REQUESTS_PER_VIEW)
+            ],
+        )
+
+    def test_asset_search_data_transfers(self):
+        url = reverse("trakset:asset_search_data")
+        self.assertBudget(
+            "asset_search_data transfers",
+            [
+                (
+                    "get",
+                    url,
+                    {
+                        "table": "transfers",
+                        "asset": asset.pk,
+                        "search[value]": "user1",
+                        "order[0][column]": 6,
+                        "order[0][dir]": "asc",
+                    },
+                )
+                for asset in self.assets[:REQUESTS_PER_VIEW]
+            ],
+        )
+
+    def test_asset_autocomplete(self):
+        url = reverse("trakset:asset_autocomplete")
+        self.load_search_index()
+        self.assertBudget(
+            "asset_autocomplete",
+            [
+                ("get", url, {"q": query})
+                for query in ("dri", "SN0000", "17", "cord", "dr")
+            ],
+        )
+
+    def test_asset_autocomplete_cached(self):
+        url = reverse("trakset:asset_autocomplete")
+        self.client.get(url, {"q": "cordless"})
+        self.assertBudget(
+            "asset_autocomplete cached", [("get", url, {"q": "cordless"})]
+        )
+
+    def test_asset_transfer_detail_view(self):
+        url = reverse("trakset:asset_transfer_detail_view", args=[self.transfer.pk])
+        self.assertBudget("asset_transfer_detail_view", [("get", url, None)])
+
+    def test_admin_changelists(self):
+        for model in admin.site._registry:
+            if model._meta.app_label != app_name:
+                continue
+            name = f"admin:{app_name}_{model._meta.model_name}_changelist"
+            # The first listing of an asset stores its label, so the counts
+            # are of the renders after that.
+            self.client.get(reverse(name))
+            self.assertBudget(name, [("get", reverse(name), None)])
+        self.assertEqual(AssetLabel.objects.count(), SEED_ASSETS)
+
+
+class TransferServiceTests(TestCase):
+    """Scanning assets and cancelling their transfers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.holder = User.objects.create_user("holder", "holder@example.com")
+        cls.user = User.objects.create_user(
+            "user",
+            "user@example.com",
+            "password",
+            is_staff=True,
+        )
+        cls.other = User.objects.create_user("other", "other@example.com")
+        cls.asset = Asset.objects.create(name="Ladder", current_holder=cls.holder)
+
+    def test_transfer(self):
+        result = transfer_asset(self.asset.pk, self.user)
+        self.assertTrue(result.won)
+        self.assertEqual(
+            (result.transfer.from_user, result.transfer.to_user),
+            (self.holder, self.user),
+        )
+        self.asset.refresh_from_db()
+        self.assertEqual(self.asset.current_holder, self.user)
+        self.assertEqual(self.asset.last_transfer, result.transfer)
+
+    def test_repeat_transfer(self):
+        first = transfer_asset(self.asset.pk, self.user)
+        repeat = transfer_asset(self.asset.pk, self.user)
+        self.assertFalse(repeat.won)
+        self.assertEqual(repeat.transfer, first.transfer)
+        self.assertEqual(AssetTransfer.objects.count(), 1)
+        # Another user's scan, or one after TRANSFER_TIMEOUT, wins.
+        self.assertTrue(transfer_asset(self.asset.pk, self.other).won)
+        AssetTransfer.objects.update(
+            created_at=timezone.now() - datetime.timedelta(days=30),
+        )
+        self.assertTrue(transfer_asset(self.asset.pk, self.other).won)
+        self.assertEqual(AssetTransfer.objects.count(), 3)
+
+    def test_cancel_latest_transfer(self):
+        older = transfer_asset(self.asset.pk, self.user).transfer
+        latest = transfer_asset(self.asset.pk, self.other).transfer
+        self.assertTrue(cancel_transfer(latest.pk).won)
+        self.asset.refresh_from_db()
+        self.assertEqual(self.asset.current_holder, self.user)
+        self.assertEqual(self.asset.last_transfer, older)
+
+    def test_cancel_older_transfer(self):
+        older = transfer_asset(self.asset.pk, self.user).transfer
+        latest = transfer_asset(self.asset.pk, self.other).transfer
+        self.assertTrue(cancel_transfer(older.pk).won)
+        self.asset.refresh_from_db()
+        self.assertEqual(self.asset.current_holder, self.other)
+        self.assertEqual(self.asset.last_transfer, latest)
+        self.assertTrue(AssetTransfer.global_objects.get(pk=older.pk).is_deleted)
+
+    def test_repeat_cancel(self):
+        transfer = transfer_asset(self.asset.pk, self.user).transfer
+        self.assertTrue(cancel_transfer(transfer.pk).won)
+        repeat = cancel_transfer(transfer.pk)
+        self.assertFalse(repeat.won)
+        self.assertEqual(repeat.transfer, transfer)
+        self.asset.refresh_from_db()
+        self.assertEqual(self.asset.current_holder, self.holder)
+        self.assertIsNone(self.asset.last_transfer)
+
+    def test_cancel_unknown_transfer(self):
+        self.assertEqual(
+            cancel_transfer(uuid.uuid4()),
+            TransferResult(transfer=None, won=False),
+        )
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("trakset:asset_transfer_cancel", args=[uuid.uuid4()]),
+        )
+        self.assertRedirects(response, reverse("about"), fetch_redirect_response=False)
+
+    def test_cancel_transfer_deleted_meanwhile(self):
+        transfer = transfer_asset(self.asset.pk, self.user).transfer
+        aget_object = AssetTransferCancelView.aget_object
+
+        async def aget_then_delete(view, queryset=None):
+            asset_transfer = await aget_object(view, queryset)
+            await sync_to_async(asset_transfer.hard_delete)()
+            return asset_transfer
+
+        self.client.force_login(self.user)
+        with mock.patch.object(
+            AssetTransferCancelView,
+            "aget_object",
+            aget_then_delete,
+        ):
+            response = self.client.post(
+                reverse("trakset:asset_transfer_cancel", args=[transfer.pk]),
+            )
+        self.assertRedirects(response, reverse("about"), fetch_redirect_response=False)
+
+
+class BulkTransferTests(TestCase):
+    """Handing a kit of assets over to one user at once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.holder = User.objects.create_user("holder", "holder@example.com")
+        cls.user = User.objects.create_user("user", "user@example.com")
+        cls.subscribers = [
+            User.objects.create_user(f"subscriber{i}", f"subscriber{i}@example.com")
+            for i in range(2)
+        ]
+        no_email = User.objects.create_user("no_email")
+        cls.ladder = Asset.objects.create(name="Ladder", current_holder=cls.holder)
+        cls.drill = Asset.objects.create(name="Drill", current_holder=cls.holder)
+        cls.saw = Asset.objects.create(name="Saw", current_holder=cls.user)
+        cls.ladder.send_user_email_on_transfer.set([*cls.subscribers, no_email])
+        cls.drill.send_user_email_on_transfer.set(cls.subscribers[:1])
+        cls.saw.send_user_email_on_transfer.set(cls.subscribers[1:])
+
+    def test_bulk_transfer(self):
+        missing = uuid.uuid4()
+        cache.set(SEARCH_GENERATION_KEY, 1, None)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = transfer_assets(
+                [
+                    self.ladder.unique_id,
+                    self.drill.unique_id,
+                    self.saw.unique_id,
+                    missing,
+                    self.ladder.unique_id,
+                ],
+                self.user,
+            )
+        # Assets are locked, and so transferred, in primary key order.
+        self.assertEqual(
+            [
+                (transfer.asset, transfer.from_user, transfer.to_user)
+                for transfer in result.transfers
+            ],
+            [
+                (self.ladder, self.holder, self.user),
+                (self.drill, self.holder, self.user),
+            ],
+        )
+        self.assertEqual(AssetTransfer.objects.count(), 2)
+        self.assertEqual(result.skipped, [self.saw])
+        self.assertEqual(result.missing, [missing])
+        for transfer in result.transfers:
+            asset = Asset.objects.get(pk=transfer.asset_id)
+            self.assertEqual(asset.current_holder, self.user)
+            self.assertEqual(asset.last_transfer, transfer)
+            self.assertEqual(
+                AssetState.objects.get(asset_id=asset.pk).holder_username,
+                "user",
+            )
+        self.assertEqual(cache.get(SEARCH_GENERATION_KEY), 2)
+
+    def test_bulk_transfer_emails(self):
+        transfer_assets(
+            [self.ladder.unique_id, self.drill.unique_id, self.saw.unique_id],
+            self.user,
+        )
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.task_name, email_users_on_bulk_asset_transfer.name)
+        email_users_on_bulk_asset_transfer(*message.args)
+        emails = {email.to[0]: email for email in mail.outbox}
+        self.assertEqual(len(mail.outbox), len(self.subscribers))
+        self.assertEqual(
+            set(emails),
+            {subscriber.email for subscriber in self.subscribers},
+        )
+        # One email lists every asset of the subscriber's that moved.
+        html = emails["subscriber0@example.com"].alternatives[0][0]
+        self.assertIn("Ladder", html)
+        self.assertIn("Drill", html)
+        html = emails["subscriber1@example.com"].alternatives[0][0]
+        self.assertIn("Ladder", html)
+        self.assertNotIn("Saw", html)
+
+    def test_bulk_transfer_nothing_to_do(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            result = transfer_assets([self.saw.unique_id], self.user)
+        self.assertEqual((result.transfers, result.skipped), ([], [self.saw]))
+        self.assertEqual(callbacks, [])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class NgramSearchBackendTests(TestCase):
+    """Reloading the n-gram index the SQLite search runs on."""
+
+    @classmethod
+    def setUpTestData(cls):
+        holder = User.objects.create_user("holder", "holder@example.com")
+        cls.ladder = Asset.objects.create(name="Ladder", current_holder=holder)
+        cls.drill = Asset.objects.create(name="Cordless drill", current_holder=holder)
+
+    def search(self, backend, text):
+        return list(backend.rank(Asset.objects.all(), text))
+
+    def test_changes_during_reload_are_kept(self):
+        backend = NgramSearchBackend()
+        backend.ensure_loaded()
+        test, ladder, drill = self, self.ladder, self.drill
+
+        class ChangingIndex(NgramIndex):
+            def add(index, pk, *fields):
+                super().add(pk, *fields)
+                if pk != drill.pk:
+                    return
+                # Both rows have been read, and now change.
+                with test.captureOnCommitCallbacks(execute=True):
+                    ladder.name = "Pallet jack"
+                    backend.index_asset(ladder)
+                    backend.unindex_asset(drill.pk)
+
+        backend._loaded_at = None
+        with mock.patch("trakset.search.NgramIndex", ChangingIndex):
+            backend.ensure_loaded()
+        self.assertEqual(self.search(backend, "pallet jack"), [ladder])
+        self.assertEqual(self.search(backend, "ladder"), [])
+        self.assertEqual(self.search(backend, "cordless drill"), [])
+
+    def test_one_reload_at_a_time(self):
+        backend = NgramSearchBackend(max_age=0)
+        backend.ensure_loaded()
+        loading = threading.Event()
+        finish = threading.Event()
+
+        def load():
+            loading.set()
+            finish.wait(5)
+
+        with mock.patch.object(backend, "load", side_effect=load) as load_mock:
+            reloader = threading.Thread(target=backend.ensure_loaded)
+            reloader.start()
+            self.assertTrue(loading.wait(5))
+            # The index is stale, but these serve the old one meanwhile.
+            for _ in range(3):
+                self.assertEqual(self.search(backend, "ladder"), [self.ladder])
+            finish.set()
+            reloader.join()
+        self.assertEqual(load_mock.call_count, 1)
+
+
+class PurgeOrphanTransferNotesTests(TestCase):
+    """The command purging notes drafts left behind by the transfer page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user("user", "user@example.com")
+        asset = Asset.objects.create(name="Ladder", current_holder=user)
+        transfer = AssetTransfer.objects.create(asset=asset, to_user=user)
+        cls.attached = AssetTransferNotes.objects.create(
+            asset_transfer=transfer,
+            text="Left in the van",
+        )
+        cancelled = AssetTransfer.objects.create(asset=asset, to_user=user)
+        cls.detached = AssetTransferNotes.objects.create(
+            asset_transfer=cancelled,
+            text="Ladder is missing a foot",
+        )
+        cancelled.delete()
+        cls.drafts = AssetTransferNotes.objects.bulk_create(
+            [
+                AssetTransferNotes(text=""),
+                AssetTransferNotes(text="Left in the van"),
+            ],
+        )
+        AssetTransferNotes.global_objects.update(
+            created_at=timezone.now() - datetime.timedelta(days=2),
+        )
+        cls.recent_draft = AssetTransferNotes.objects.create(text="")
+
+    def purge(self, *args):
+        stdout = io.StringIO()
+        call_command("purge_orphan_transfer_notes", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def remaining(self):
+        return set(AssetTransferNotes.global_objects.values_list("pk", flat=True))
+
+    def test_purge_drafts(self):
+        # Cancelling the transfer detached its notes.
+        self.detached.refresh_from_db()
+        self.assertIsNone(self.detached.asset_transfer)
+        self.assertIn("Purged 2 orphaned notes.", self.purge())
+        self.assertEqual(
+            self.remaining(),
+            {self.attached.pk, self.detached.pk, self.recent_draft.pk},
+        )
+
+    def test_purge_detached(self):
+        self.assertIn("Purged 3 orphaned notes.", self.purge("--include-detached"))
+        self.assertEqual(self.remaining(), {self.attached.pk, self.recent_draft.pk})
+
+    def test_dry_run(self):
+        notes = self.remaining()
+        self.assertIn(
+            "2 draft notes and 1 detached notes found; 2 would be purged.",
+            self.purge("--dry-run"),
+        )
+        self.assertIn(
+            "3 would be purged.",
+            self.purge("--dry-run", "--include-detached"),
+        )
+        self.assertEqual(self.remaining(), notes)
+
+    def test_batches(self):
+        AssetTransferNotes.objects.bulk_create(
+            [AssetTransferNotes(text="") for _ in range(5)],
+        )
+        AssetTransferNotes.global_objects.filter(
+            asset_transfer__isnull=True,
+        ).exclude(pk=self.recent_draft.pk).update(
+            created_at=timezone.now() - datetime.timedelta(days=2),
+        )
+        self.assertIn("Purged 7 orphaned notes.", self.purge("--batch-size", "2"))
+        self.assertEqual(
+            self.remaining(),
+            {self.attached.pk, self.detached.pk, self.recent_draft.pk},
+        )
+
+
+class SearchTests(SeededTestCase):
+    """Asset search, its backends and its cache."""
+
+    def test_asset_search(self):
+        response = self.client.get(
+            reverse("trakset:asset_search"),
+            {"search": "drill 7", "search_type": "assets"},
+        )
+        self.assertEqual(response.context["asset"].name, "Cordless drill 7")
+
+    def test_asset_search_exact(self):
+        url = reverse("trakset:asset_search")
+        asset = self.assets[7]
+        for search in (
+            str(asset.unique_id),
+            str(asset.security_tag_number),
+            asset.serial_number.lower(),
+        ):
+            with self.subTest(search):
+                response = self.client.get(
+                    url,
+                    {"search": search, "search_type": "assets"},
+                )
+                self.assertEqual(response.context["search_results"][0].pk, asset.pk)
+
+    def test_asset_search_non_ascii_digits(self):
+        # str.isdigit() accepts these, but int() cannot parse them.
+        url = reverse("trakset:asset_search")
+        for search in ("1²", "²", "١٢"):
+            with self.subTest(search):
+                response = self.client.get(
+                    url,
+                    {"search": search, "search_type": "assets", "asset": search},
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_asset_search_fulltext(self):
+        # Without a full-text index the n-gram backend ranks fuzzily.
+        response = self.client.get(
+            reverse("trakset:asset_search"),
+            {"search": "cordless drill 7", "search_type": "fulltext"},
+        )
+        self.assertIn(
+            self.assets[7].pk,
+            [asset.pk for asset in response.context["search_results"]],
+        )
+
+    def test_asset_search_cache_invalidated(self):
+        url = reverse("trakset:asset_search")
+        asset = self.assets[0]
+        params = {"search": "drill", "search_type": "transfers", "asset": asset.pk}
+        self.client.get(url, params)
+        # A scan bumps the search generation, so the new transfer shows up.
+        self.client.force_login(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("trakset:asset_transfer", args=[asset.unique_id]))
+        self.client.force_login(self.admin)
+        response = self.client.get(url, {**params, "search": " DRILL "})
+        self.assertEqual(response.context["search_results"][0].to_user, self.staff)
+
+    def test_asset_search_index_updates(self):
+        url = reverse("trakset:asset_search")
+        params = {"search": "pallet jack", "search_type": "assets"}
+        self.client.get(url, {"search": "drill", "search_type": "assets"})
+        asset = self.assets[3]
+        asset.name = "Pallet jack"
+        with self.captureOnCommitCallbacks(execute=True):
+            asset.save()
+        response = self.client.get(url, params)
+        self.assertEqual(response.context["asset"].pk, asset.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            asset.delete()
+        response = self.client.get(url, params)
+        self.assertNotIn("asset", response.context)
+
+    def test_asset_autocomplete(self):
+        url = reverse("trakset:asset_autocomplete")
+        response = self.client.get(url, {"q": "17"})
+        # Security tag 17 and the name ending in 17 both match fully.
+        self.assertEqual(
+            [result["name"] for result in response.json()["results"][:2]],
+            ["Cordless drill 16", "Cordless drill 17"],
+        )
+        # str.isdigit() accepts "²", but int() cannot parse it.
+        for query in ("1²", "²²"):
+            self.assertEqual(self.client.get(url, {"q": query}).status_code, 200)
+
+    def test_asset_autocomplete_cached(self):
+        suggestion = {
+            "unique_id": self.assets[0].unique_id,
+            "name": self.assets[0].name,
+            "serial_number": self.assets[0].serial_number,
+            "security_tag_number": self.assets[0].security_tag_number,
+        }
+        cache.set(
+            autocomplete_cache_key("cordless", AssetAutocompleteView.limit),
+            [suggestion],
+        )
+        response = self.client.get(
+            reverse("trakset:asset_autocomplete"),
+            {"q": " Cordless "},
+        )
+        self.assertEqual(response.json()["results"][0]["name"], self.assets[0].name)
+
+
+class PaginationTests(SeededTestCase):
+    """Keyset pagination of transfer histories and the search grids."""
+
+    def test_asset_search_data_transfers(self):
+        data = self.client.get(
+            reverse("trakset:asset_search_data"),
+            {
+                "table": "transfers",
+                "asset": self.assets[0].pk,
+                "deleted_cb": "on",
+                "search[value]": "user1",
+                "length": 5,
+            },
+        ).json()
+        self.assertEqual(data["recordsTotal"], SEED_TRANSFERS_PER_ASSET)
+        self.assertEqual(len(data["data"]), 5)
+
+    def test_asset_search_data_pages(self):
+        url = reverse("trakset:asset_search_data")
+        params = {
+            "table": "transfers",
+            "asset": self.assets[0].pk,
+            "deleted_cb": "on",
+            "length": 7,
+            # Usernames are not orderable, so this keeps the default order.
+            "order[0][column]": 4,
+            "order[0][dir]": "asc",
+        }
+        seen = []
+        data = self.client.get(url, params).json()
+        while True:
+            seen.extend(row["id"] for row in data["data"])
+            if not data["next_cursor"]:
+                break
+            data = self.client.get(
+                url,
+                {**params, "start": len(seen), "after": data["next_cursor"]},
+            ).json()
+        history = AssetTransfer.global_objects.filter(asset=self.assets[0])
+        self.assertEqual(
+            seen,
+            [
+                str(pk)
+                for pk in history.order_by("-created_at", "-pk").values_list(
+                    "pk",
+                    flat=True,
+                )
+            ],
+        )
+        # Jumping to a page without its cursor reads it with an OFFSET.
+        data = self.client.get(url, {**params, "start": 14}).json()
+        self.assertEqual([row["id"] for row in data["data"]], seen[14:21])
+
+    def test_transfer_history_pages(self):
+        history = AssetTransfer.global_objects.filter(asset=self.assets[0])
+        seen = []
+        page = keyset_page(history, per_page=7)
+        while True:
+            seen.extend(page.object_list)
+            if not page.has_next:
+                break
+            with self.assertNumQueries(1):
+                page = keyset_page(history, after=page.next_cursor, per_page=7)
+        self.assertEqual(
+            [transfer.pk for transfer in seen],
+            list(history.order_by("-created_at", "-pk").values_list("pk", flat=True)),
+        )
+        with self.assertNumQueries(1):
+            previous = keyset_page(history, before=page.previous_cursor, per_page=7)
+        self.assertEqual(
+            previous.object_list,
+            seen[-len(page.object_list) - 7 : -len(page.object_list)],
+        )
+
+    def test_transfer_history_bad_cursor(self):
+        url = reverse("trakset:asset_search")
+        first_page = self.client.get(
+            url,
+            {"search": "drill", "search_type": "transfers", "asset": self.assets[0].pk},
+        ).context["search_results"]
+        for cursor in (
+            base64.urlsafe_b64encode(b"2026-01-01T00:00:00|not-a-uuid").decode(),
+            base64.urlsafe_b64encode(b"yesterday|1").decode(),
+            "not base64",
+        ):
+            with self.subTest(cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                cache.clear()
+                response = self.client.get(
+                    url,
+                    {
+                        "search": "drill",
+                        "search_type": "transfers",
+                        "asset": self.assets[0].pk,
+                        "after": cursor,
+                    },
+                )
+                # An invalid cursor shows the first page.
+                self.assertEqual(response.context["search_results"], first_page)
+
+    def test_estimated_count_paginator(self):
+        # Filtered, so PostgreSQL estimates through EXPLAIN.
+        transfers = AssetTransfer.objects.order_by("-created_at")
+        paginator = EstimatedCountPaginator(transfers, 100)
+        paginator.estimate_threshold = 0
+        if connection.vendor == "postgresql":
+            self.assertEqual(paginator.count, estimate_count(transfers))
+        else:
+            # Without planner estimates the count is exact.
+            self.assertIsNone(estimate_count(transfers))
+            self.assertEqual(paginator.count, transfers.count())
+
+
+class AssetStateTests(SeededTestCase):
+    """The denormalized AssetState rows behind the listings."""
+
+    def test_asset_state_survives_soft_delete(self):
+        asset = Asset.objects.get(pk=self.assets[0].pk)
+        asset.delete()
+        self.assertTrue(AssetState.objects.get(asset_id=asset.pk).is_deleted)
+        asset.restore(strict=False)
+        self.assertFalse(AssetState.objects.get(asset_id=asset.pk).is_deleted)
+        asset.hard_delete()
+        self.assertFalse(AssetState.objects.filter(asset_id=asset.pk).exists())
+
+
+class LabelTests(SeededTestCase):
+    """Stored asset labels and the printable label sheets made from them."""
+
+    def test_asset_label_survives_soft_delete(self):
+        asset = Asset.objects.get(pk=self.assets[0].pk)
+        refresh_asset_labels([asset], LABEL_BASE_URL, self.admin)
+        asset.delete()
+        asset.restore(strict=False)
+        asset = Asset.objects.select_related("label").get(pk=asset.pk)
+        self.assertTrue(asset.label.url.startswith(LABEL_BASE_URL))
+        self.assertEqual(refresh_asset_labels([asset], LABEL_BASE_URL, self.admin), 0)
+        asset.hard_delete()
+        self.assertFalse(AssetLabel.objects.filter(asset_id=asset.pk).exists())
+
+    def test_label_sheet(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        assets = self.assets[:25]
+        with self.settings(MEDIA_ROOT=media_root):
+            self.client.post(
+                reverse("admin:trakset_assetproxy_changelist"),
+                {
+                    "action": "make_label_sheet",
+                    "_selected_action": [asset.pk for asset in assets],
+                },
+            )
+            sheet = LabelSheet.objects.get()
+            self.assertEqual(OutboxMessage.objects.get().args, [str(sheet.pk)])
+            generate_label_sheet(str(sheet.pk))
+            sheet.refresh_from_db()
+            self.assertEqual(sheet.status, LabelSheet.Status.DONE)
+            self.assertEqual(sheet.page_count, 2)
+            self.assertEqual(AssetLabel.objects.count(), len(assets))
+            response = self.client.get(
+                reverse("admin:trakset_labelsheet_download", args=[sheet.pk]),
+            )
+            self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+            response.close()
+
+    def test_label_sheet_in_daemonic_worker(self):
+        asset = Asset.objects.select_related("label").get(pk=self.assets[0].pk)
+        refresh_asset_labels([asset], LABEL_BASE_URL, self.admin)
+        labels = [(bytes(asset.label.qr_code), label_caption(asset))] * 25
+        # Pool workers are daemonic, as Celery's prefork workers are.
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            self.assertEqual(pool.apply(render_sheet_pages, [labels]), 2)
+
+
+class OutboxTests(TestCase):
+    """Queueing tasks in the outbox and publishing them to the broker."""
+
+    def test_scan_enqueues_in_its_transaction(self):
+        user = User.objects.create_user("user", "user@example.com")
+        asset = Asset.objects.create(name="Ladder", current_holder=user)
+        asset.send_user_email_on_transfer.add(user)
+        scanner = User.objects.create_user("scanner", "scanner@example.com")
+        with mock.patch("trakset.outbox.current_app") as app:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                transfer = transfer_asset(asset.pk, scanner).transfer
+                message = OutboxMessage.objects.get()
+                self.assertEqual(
+                    (message.task_name, message.args),
+                    (email_users_on_asset_transfer.name, [str(transfer.pk)]),
+                )
+                raise RuntimeError
+            # Rolling the scan back drops its message with it.
+            self.assertFalse(AssetTransfer.objects.exists())
+            self.assertFalse(OutboxMessage.objects.exists())
+            transfer = transfer_asset(asset.pk, scanner).transfer
+            self.assertEqual(
+                OutboxMessage.objects.get().args,
+                [str(transfer.pk)],
+            )
+            # Nothing reaches the broker until the outbox is drained.
+            app.signature.assert_not_called()
+
+    def test_outbox_skips_failing_message(self):
+        OutboxMessage.objects.create(task_name="broken", args=[])
+        OutboxMessage.objects.create(task_name="working", args=[])
+
+        def signature(task_name, args):
+            if task_name == "broken":
+                raise ConnectionError(task_name)
+            return mock.Mock()
+
+        with (
+            mock.patch("trakset.outbox.current_app") as app,
+            self.assertLogs("trakset.outbox", "ERROR"),
+        ):
+            app.signature.side_effect = signature
+            self.assertEqual(drain(), 1)
+            # Not due again until its retry delay has passed.
+            self.assertEqual(drain(), 0)
+            message = OutboxMessage.objects.get()
+            self.assertEqual((message.task_name, message.attempts), ("broken", 1))
+            self.assertGreater(message.next_attempt_at, timezone.now())
+            OutboxMessage.objects.update(
+                attempts=MAX_ATTEMPTS - 1,
+                next_attempt_at=timezone.now(),
+            )
+            self.assertEqual(drain(), 0)
+            self.assertEqual(drain(), 0)
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, MAX_ATTEMPTS)
+        self.assertIsNotNone(message.failed_at)
+        self.assertEqual(app.signature.call_count, 3)
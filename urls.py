@@ -1,6 +1,9 @@
 from django.urls import path
 from django.views.generic import TemplateView
 
+from .views import AssetAutocompleteView
+from .views import AssetBulkTransferView
+from .views import AssetSearchDataView
 from .views import AssetSearchView
 from .views import AssetTransferCancelView
 from .views import AssetTransferDetailView
@@ -9,6 +12,11 @@ from .views import AssetTransferView
 app_name = "trakset"
 
 urlpatterns = [
+    path(
+        "assets/transfer/bulk/",
+        AssetBulkTransferView.as_view(),
+        name="asset_bulk_transfer",
+    ),
     path(
         "assets/transfer/<uuid:uuid>/",
         AssetTransferView.as_view(),
@@ -34,6 +42,16 @@ urlpatterns = [
         AssetSearchView.as_view(template_name="asset_search.html"),
         name="asset_search",
     ),
+    path(
+        "assets/transfer/search/data/",
+        AssetSearchDataView.as_view(),
+        name="asset_search_data",
+    ),
+    path(
+        "assets/transfer/search/autocomplete/",
+        AssetAutocompleteView.as_view(),
+        name="asset_autocomplete",
+    ),
     path(
         "assets/transfer/view/<uuid:pk>/",
         AssetTransferDetailView.as_view(),
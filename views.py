@@ -1,45 +1,92 @@
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.contrib.postgres.search import TrigramSimilarity
-from django.db import transaction
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+from django.http import JsonResponse
 from django.shortcuts import redirect
-from django.shortcuts import render
+from django.template.response import TemplateResponse
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
 from django.views.generic import DetailView
 from django.views.generic import FormView
 from django.views.generic import View
-from django.views.generic.edit import DeleteView
 
+from .caching import AUTOCOMPLETE_CACHE_TIMEOUT
+from .caching import SEARCH_CACHE_TIMEOUT
+from .caching import aget_asset_snapshot
+from .caching import aget_autocomplete
+from .caching import aget_search_generation
+from .caching import search_cache_key
+from .datatables import Column
+from .datatables import DataTablesRequest
+from .forms import AssetBulkTransferForm
 from .forms import AssetTransferNotesForm
 from .models import Asset
 from .models import AssetTransfer
 from .models import AssetTransferNotes
+from .outbox import aenqueue
+from .outbox import enqueue
+from .pagination import PER_PAGE
+from .pagination import aestimated_count
+from .pagination import akeyset_page
+from .search import exact_asset_matches
+from .search import get_search_backend
+from .services import cancel_transfer
+from .services import transfer_asset
+from .services import transfer_assets
 from .tasks import email_admin_on_error
-from .tasks import email_users_on_asset_transfer
+
+
+class AsyncLoginRequiredMixin:
+    """
+    Async counterpart of login_required and staff_member_required.
+
+    The user is loaded with request.auser() so the check never touches the
+    database synchronously, and is then cached on request.user for the
+    templates.
+    """
+
+    staff_required = False
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if self.staff_required and not (
+            request.user.is_active and request.user.is_staff
+        ):
+            return redirect_to_login(
+                request.get_full_path(),
+                reverse("admin:login"),
+            )
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await super().dispatch(request, *args, **kwargs)
 
 
 # Create your views here.
-@method_decorator(login_required, name="dispatch")
-class AssetTransferView(FormView):
+class AssetTransferView(AsyncLoginRequiredMixin, FormView):
     model = AssetTransferNotes
     form_class = AssetTransferNotesForm
     template_name = "asset_transfer.html"
     success_url = "asset_transfer_success.html"
+    http_method_names = ["get", "post", "head", "options"]
 
-    def get_asset(self, uuid: str):
-        """Get the asset, handling errors and emailing admin if needed."""
+    async def get_asset(self, uuid: str):
+        """Get the asset snapshot, handling errors and emailing admin if needed."""
         ep = ""
-        asset = None
-        try:
-            asset = Asset.objects.get(unique_id=self.kwargs["uuid"])
-        except Asset.DoesNotExist:
-            try:
-                asset = Asset.global_objects.get(unique_id=self.kwargs["uuid"])
+        asset = await aget_asset_snapshot(self.kwargs["uuid"])
+        if asset is None or asset.is_deleted:
+            if asset is not None:
                 msg1 = "soft-deleted"
                 msg2 = "This probably means that the asset needs to be restored."
-            except Asset.DoesNotExist:
+            else:
                 msg1 = "non-existent"
                 msg2 = "The asset has probably been hard deleted, and should \
                         be re-created."
@@ -49,106 +96,100 @@ class AssetTransferView(FormView):
                     "Asset not found.  This issue \
                                               has been reported.",
                 )
-            finally:
-                email_admin_on_error.delay(
-                    f"User {self.request.user.username} tried to access a \
-                     {msg1} asset with id {self.kwargs['uuid']}. {msg2}",
-                )
+            await aenqueue(
+                email_admin_on_error,
+                f"User {self.request.user.username} tried to access a \
+                 {msg1} asset with id {self.kwargs['uuid']}. {msg2}",
+            )
         return asset, ep
 
-    def get(self, request, uuid, *args, **kwargs):
-        super().get(request, *args, **kwargs)
-        asset, ep = self.get_asset(uuid=uuid)
+    async def get(self, request, uuid, *args, **kwargs):
+        asset, ep = await self.get_asset(uuid=uuid)
         if asset is None:
             if ep:
                 return redirect(ep)
             return redirect("about")
 
-        asset_transfer = (
-            AssetTransfer.global_objects.order_by("created_at").last()
-            if AssetTransfer.global_objects.exists()
-            else None
-        )
-        if (
-            asset_transfer
-            and asset_transfer.to_user == request.user
-            and asset_transfer.was_transferred_recently()
-        ):
+        result = await sync_to_async(transfer_asset)(asset.pk, request.user)
+        asset_transfer = result.transfer
+        if not result.won:
             messages.warning(
                 request,
                 "This asset has been transferred to you recently. \
                  Do you want to cancel the transfer?",
             )
-        else:
-            asset_transfer = AssetTransfer.objects.create(
-                asset=asset,
-                from_user=asset.current_holder,
-                to_user=request.user,
-            )
-            if asset_transfer.asset.send_user_email_on_transfer.exists():
-                transaction.on_commit(
-                    lambda: email_users_on_asset_transfer.delay(asset_transfer.id),
-                )
-            asset.current_holder = request.user
-            asset.save()
-        context_data = self.get_context_data(asset=asset, **kwargs)
-        context_data["asset_name"] = asset.name
-        context_data["asset_location"] = (
-            asset.location.name if asset.location else "Not set"
+        context_data = self.get_context_data(
+            asset=asset,
+            form=await self.aget_form(),
+            **kwargs,
         )
+        context_data["asset_name"] = asset.name
+        context_data["asset_location"] = asset.location_name or "Not set"
         context_data["asset_id"] = str(self.kwargs["uuid"])
         context_data["transfer"] = asset_transfer
         return self.render_to_response(context_data)
 
-    def get_form(self, form_class=None):
-        """Override to pass the asset transfer instance to the form."""
-        super().get_form(form_class)
-        last_asset_transfer_notes = AssetTransferNotes.objects.filter(
+    async def aget_form(self):
+        """
+        Return the notes form pre-filled with the asset's last notes.
+
+        The draft is an unsaved instance; nothing is written until post().
+        """
+        last_asset_transfer_notes = await AssetTransferNotes.objects.filter(
             asset_transfer__asset__unique_id=self.kwargs["uuid"],
-        ).last()
+        ).alast()
         if last_asset_transfer_notes:
             asset_transfer_text = last_asset_transfer_notes.text
         else:
             asset_transfer_text = ""
-        asset_transfer_notes = AssetTransferNotes.objects.create(
-            text=asset_transfer_text,
-        )
+        asset_transfer_notes = AssetTransferNotes(text=asset_transfer_text)
         return AssetTransferNotesForm(instance=asset_transfer_notes)
 
-    def post(self, request, uuid):
+    async def post(self, request, uuid):
         form = AssetTransferNotesForm(request.POST)
-        asset_transfer = AssetTransfer.objects.filter(
+        asset_transfer = await AssetTransfer.objects.filter(
             to_user=request.user,
             asset__unique_id=self.kwargs["uuid"],
-        ).last()
-        notes = asset_transfer.notes.last()
+        ).alast()
+        notes = await asset_transfer.notes.alast()
         form_text = form.data.get("text", "")
         if notes is None and form_text != "":
-            asset_transfer.notes.create(text=form_text)
-            asset_transfer.save()
+            await asset_transfer.notes.acreate(text=form_text)
+            await asset_transfer.asave()
         elif notes is not None:
             text_to_save = form_text
-            asset_transfer.notes.create(text=text_to_save)
-            asset_transfer.save()
+            await asset_transfer.notes.acreate(text=text_to_save)
+            await asset_transfer.asave()
         return redirect("trakset:asset_transfer_notes_added", uuid=uuid)
 
 
-@method_decorator(login_required, name="dispatch")
-class AssetTransferCancelView(DeleteView):
+class AssetTransferCancelView(AsyncLoginRequiredMixin, DetailView):
     template_name = "asset_confirm_cancel.html"
     success_url = "trakset:asset_transfer_cancel_success"
     model = AssetTransfer
 
-    def form_valid(self, form):
-        """Render the form again, with current form data and custom context."""
-        context = self.get_context_data(form=form)
-        transfer = context["object"]
-        transfer.asset.current_holder = transfer.from_user
-        transfer.asset.save()
+    async def post(self, request, *args, **kwargs):
+        """Cancel the transfer and redirect to the success page."""
+        self.object = await self.aget_object()
+        if self.object is None:
+            return redirect("about")
+        transfer = self.object
         transfer_id = transfer.id
         transfer_from_user_name = transfer.from_user.username
-        transfer.delete()
-        context.pop("object")
+        result = await sync_to_async(cancel_transfer)(transfer_id)
+        if result.transfer is None:
+            # Hard deleted since it was looked up above.
+            messages.warning(
+                self.request,
+                "AssetTransfer matching the query does not exist",
+            )
+            return redirect("about")
+        if not result.won:
+            messages.warning(
+                self.request,
+                "This asset transfer has already been cancelled.",
+            )
+            return redirect("about")
         return redirect(
             reverse(
                 "trakset:asset_transfer_cancel_success",
@@ -159,7 +200,10 @@ class AssetTransferCancelView(DeleteView):
             ),
         )
 
-    def get_object(self, queryset=None):
+    def get_queryset(self):
+        return AssetTransfer.objects.select_related("asset", "from_user", "to_user")
+
+    async def aget_object(self, queryset=None):
         """
         Return the object the view is displaying.
         Require `self.queryset` and a `pk` or `slug` argument in the URLconf.
@@ -190,7 +234,7 @@ class AssetTransferCancelView(DeleteView):
             )
         try:
             # Get the single item from the filtered queryset
-            obj = queryset.get()
+            obj = await queryset.aget()
         except queryset.model.DoesNotExist:
             messages.warning(
                 self.request,
@@ -199,129 +243,348 @@ class AssetTransferCancelView(DeleteView):
             return None
         return obj
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aget_object()
         if self.object is not None:
-            context = super().get_context_data(**kwargs)
-            return render(request, self.template_name, context)
+            context = self.get_context_data(**kwargs)
+            return self.render_to_response(context)
         return redirect("about")
 
 
-# a view to choose an asset and view its asset_transfer history
 @method_decorator(login_required, name="dispatch")
-@method_decorator(staff_member_required, name="dispatch")
-class AssetSearchView(View):
+class AssetBulkTransferView(FormView):
+    form_class = AssetBulkTransferForm
+    template_name = "asset_bulk_transfer.html"
+
+    def form_valid(self, form):
+        """Transfer every scanned asset to the user and show the outcome."""
+        result = transfer_assets(form.cleaned_data["unique_ids"], self.request.user)
+        if result.missing:
+            missing = ", ".join(str(unique_id) for unique_id in result.missing)
+            messages.error(
+                self.request,
+                f"{len(result.missing)} assets were not found.  This issue \
+                 has been reported.",
+            )
+            enqueue(
+                email_admin_on_error,
+                f"User {self.request.user.username} tried to bulk transfer \
+                 non-existent assets with ids {missing}.",
+            )
+        if result.skipped:
+            messages.info(
+                self.request,
+                f"{len(result.skipped)} assets are already held by you.",
+            )
+        return self.render_to_response(
+            self.get_context_data(
+                form=self.form_class(),
+                transfers=result.transfers,
+                skipped=result.skipped,
+                missing=result.missing,
+            ),
+        )
+
+
+# a view to choose an asset and view its asset_transfer history
+class AssetSearchView(AsyncLoginRequiredMixin, View):
     template_name = "asset_search.html"
+    staff_required = True
+    paginate_by = PER_PAGE
+    candidate_count = 5
+    history_per_asset = 10
+    fulltext_results = 50
 
-    def get(self, request, *args, **kwargs):
-        context = {}
-        search = request.GET.get("search", "")
+    async def get(self, request, *args, **kwargs):
+        search = " ".join(request.GET.get("search", "").split())
         if not search:
             messages.info(request, "Please enter an asset name to search.")
-            return render(request, self.template_name, context)
-        assets = (
-            Asset.objects.annotate(similarity=TrigramSimilarity("name", search))
-            .filter(
-                similarity__gt=0.2,
-            )
-            .order_by("-similarity")
-        )
-        if not assets:
-            messages.info(request, "No assets found.")
+            return TemplateResponse(request, self.template_name, {})
+        # Results are cached until the next write to an asset or transfer
+        # bumps the search generation.
+        key = search_cache_key(await aget_search_generation(), search, request.GET)
+        results = await cache.aget(key)
+        if results is None:
+            if request.GET.get("search_type") == "fulltext":
+                results = await self.afulltext(search)
+            else:
+                results = await self.asearch(request, search)
+            await cache.aset(key, results, SEARCH_CACHE_TIMEOUT)
+        context, notices = results
+        for notice in notices:
+            messages.info(request, notice)
+        return TemplateResponse(request, self.template_name, context)
+
+    async def asearch(self, request, search):
+        """Return the context and info messages for an asset or transfer search."""
+        context = {}
+        notices = []
+        candidates = await self.acandidates(request, search)
+        if not candidates:
+            notices.append("No assets found.")
         else:
+            asset = candidates[0]
             context.update(
-                {"assets": assets, "search_type": request.GET.get("search_type")},
+                {"asset": asset, "search_type": request.GET.get("search_type")},
             )
             if request.GET.get("search_type") == "transfers":
                 if request.GET.get("deleted_cb") == "on":
-                    search_results = (
-                        AssetTransfer.global_objects.select_related(
-                            "asset",
-                            "from_user",
-                            "to_user",
-                            "asset__asset_type",
-                            "asset__location",
-                            "asset__status",
-                        )
-                        .filter(
-                            asset=assets.first(),
-                        )
-                        .order_by("-created_at")
-                        .only(
-                            "id",
-                            "asset__id",
-                            "asset__name",
-                            "created_at",
-                            "from_user__username",
-                            "to_user__username",
-                            "asset__location__name",
-                            "asset__asset_type__name",
-                            "asset__status__status_type",
-                        )
-                    )
+                    transfers = AssetTransfer.global_objects
                 else:
-                    search_results = (
-                        AssetTransfer.objects.select_related(
-                            "asset",
-                            "from_user",
-                            "to_user",
-                            "asset__asset_type",
-                            "asset__location",
-                            "asset__status",
-                        )
-                        .filter(
-                            asset=assets.first(),
-                        )
-                        .order_by("-created_at")
-                        .only(
-                            "id",
-                            "asset__id",
-                            "asset__name",
-                            "created_at",
-                            "from_user__username",
-                            "to_user__username",
-                            "asset__location__name",
-                            "asset__asset_type__name",
-                            "asset__status__status_type",
-                        )
+                    transfers = AssetTransfer.objects
+                if len(candidates) > 1:
+                    context["histories"] = await self.ahistories(
+                        transfers,
+                        candidates,
                     )
-                if not search_results:
-                    messages.info(request, "Asset has no asset transfer history.")
+                    return context, notices
+                history = transfers.filter(asset=asset)
+                page = await akeyset_page(
+                    history.select_related(
+                        "asset__state",
+                        "from_user",
+                        "to_user",
+                    ).only(
+                        "id",
+                        "asset__id",
+                        "asset__name",
+                        "created_at",
+                        "deleted_at",
+                        "from_user__username",
+                        "to_user__username",
+                        "asset__state__location_name",
+                        "asset__state__asset_type_name",
+                        "asset__state__holder_username",
+                    ),
+                    after=request.GET.get("after"),
+                    before=request.GET.get("before"),
+                    per_page=self.paginate_by,
+                )
+                if not page.object_list:
+                    notices.append("Asset has no asset transfer history.")
                 else:
                     context.update(
                         {
-                            "search_results": search_results,
+                            "search_results": page.object_list,
+                            "page": page,
+                            # For the grid's deferred first load.
+                            "records_total": await aestimated_count(history),
                         },
                     )
             elif request.GET.get("search_type") == "assets":
-                search_results = (
-                    Asset.objects.select_related(
-                        "asset_type",
-                        "location",
-                        "status",
-                    )
+                search_results = [
+                    result
+                    async for result in Asset.objects.select_related("state")
                     .filter(
-                        id=assets.first().id,
+                        id=asset.id,
                     )
-                    .order_by("-created_at")
                     .only(
-                        "current_holder",
                         "name",
+                        "description",
+                        "serial_number",
                         "created_at",
-                        "location__name",
-                        "asset_type__name",
-                        "status__status_type",
+                        "state__holder_username",
+                        "state__location_name",
+                        "state__asset_type_name",
+                        "state__status_type",
                     )
-                )
+                ]
                 if not search_results:
-                    messages.info(request, "Error, unable to find asset.")
+                    notices.append("Error, unable to find asset.")
                 else:
                     context.update(
                         {
                             "search_results": search_results,
+                            "records_total": len(search_results),
                         },
                     )
-        return render(request, self.template_name, context)
+        return context, notices
+
+    async def acandidates(self, request, search):
+        """
+        Return the assets matching search, best first, from one query.
+
+        An asset picked from an earlier list of matches, or an identifier
+        that matches exactly, gives a single candidate.  Otherwise up to
+        candidate_count assets are fuzzy matched.
+        """
+        fields = ("id", "name", "state__holder_username")
+        asset_id = request.GET.get("asset", "")
+        picked = asset_id.isascii() and asset_id.isdecimal()
+        if picked:
+            matches = Asset.objects.filter(pk=asset_id)
+        else:
+            # Identifiers are looked up exactly before falling back to fuzzy
+            # matching, which would scan the trigram index.
+            matches = exact_asset_matches(search)
+        candidates = []
+        if matches is not None:
+            candidates = [
+                asset
+                async for asset in matches.select_related("state").only(
+                    *fields,
+                )[:1]
+            ]
+        if not candidates and not picked:
+            backend = get_search_backend()
+            await backend.aprepare()
+            candidates = [
+                asset
+                async for asset in backend.rank(
+                    Asset.objects.select_related("state").only(*fields),
+                    search,
+                    self.candidate_count,
+                )[: self.candidate_count]
+            ]
+        return candidates
+
+    async def ahistories(self, transfers, candidates):
+        """
+        Return (asset, recent transfers) for every candidate from one query.
+
+        ROW_NUMBER() over each asset's history keeps its newest
+        history_per_asset transfers.
+        """
+        recent = defaultdict(list)
+        async for transfer in (
+            transfers.filter(asset__in=candidates)
+            .annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("asset"),
+                    order_by=[F("created_at").desc(), F("pk").desc()],
+                ),
+            )
+            .filter(row_number__lte=self.history_per_asset)
+            .select_related("from_user", "to_user")
+            .only(
+                "id",
+                "asset",
+                "created_at",
+                "deleted_at",
+                "from_user__username",
+                "to_user__username",
+            )
+            .order_by("asset", "-created_at", "-pk")
+        ):
+            recent[transfer.asset_id].append(transfer)
+        return [(asset, recent[asset.pk]) for asset in candidates]
+
+    async def afulltext(self, search):
+        """Rank assets with the search backend's full-text matching."""
+        backend = get_search_backend()
+        await backend.aprepare()
+        assets = backend.fulltext(Asset.objects.all(), search, self.fulltext_results)
+        search_results = [
+            asset
+            async for asset in assets.select_related("state").only(
+                "name",
+                "description",
+                "serial_number",
+                "created_at",
+                "state__holder_username",
+                "state__location_name",
+                "state__asset_type_name",
+            )[: self.fulltext_results]
+        ]
+        notices = [] if search_results else ["No assets found."]
+        return {"search_type": "fulltext", "search_results": search_results}, notices
+
+
+class AssetAutocompleteView(AsyncLoginRequiredMixin, View):
+    """Suggest assets by name, serial number or security tag as staff type."""
+
+    staff_required = True
+    min_length = 2
+    limit = 10
+
+    async def get(self, request, *args, **kwargs):
+        query = " ".join(request.GET.get("q", "").split())
+        suggestions = []
+        if len(query) >= self.min_length:
+            suggestions = await aget_autocomplete(query, self.limit)
+        response = JsonResponse({"results": suggestions})
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=AUTOCOMPLETE_CACHE_TIMEOUT,
+        )
+        return response
+
+
+ASSET_COLUMNS = [
+    Column("id", "id", orderable=True),
+    Column("name", "name", orderable=True),
+    Column("description", "description"),
+    Column("location", "state__location_name"),
+    Column("asset_type", "state__asset_type_name"),
+    Column("serial_number", "serial_number"),
+    Column("current_holder", "state__holder_username"),
+    Column("created_at", "created_at", orderable=True),
+]
+TRANSFER_COLUMNS = [
+    Column("id", "id"),
+    Column("asset", "asset__name"),
+    Column("location", "asset__state__location_name"),
+    Column("asset_type", "asset__state__asset_type_name"),
+    # Not orderable: sorting an asset's history by username would need an
+    # index per user column.
+    Column("from_user", "from_user__username"),
+    Column("to_user", "to_user__username"),
+    Column("created_at", "created_at", orderable=True),
+    Column("is_deleted", "deleted_at", render=lambda value: value is not None),
+    Column("deleted_at", "deleted_at"),
+]
+
+
+class AssetSearchDataView(AsyncLoginRequiredMixin, View):
+    """
+    DataTables server-side processing for the asset search result tables.
+
+    Sorting, filtering and paging run in the database and only the visible
+    page is returned.  Sorting is limited to indexed columns; transfers are
+    always scoped to one asset's history.
+    """
+
+    staff_required = True
+
+    async def get(self, request, *args, **kwargs):
+        table = request.GET.get("table")
+        asset_id = request.GET.get("asset", "")
+        if asset_id and not (asset_id.isascii() and asset_id.isdecimal()):
+            return JsonResponse({"error": "Invalid asset."}, status=400)
+        if table == "assets":
+            columns = ASSET_COLUMNS
+            queryset = Asset.objects.all()
+            if asset_id:
+                queryset = queryset.filter(pk=asset_id)
+        elif table == "transfers" and asset_id:
+            columns = TRANSFER_COLUMNS
+            if request.GET.get("deleted_cb") == "on":
+                queryset = AssetTransfer.global_objects.filter(asset=asset_id)
+            else:
+                queryset = AssetTransfer.objects.filter(asset=asset_id)
+        else:
+            return JsonResponse({"error": "Unknown table."}, status=400)
+        params = DataTablesRequest.from_query(request.GET, columns)
+        filtered = queryset
+        if params.search and table == "assets":
+            backend = get_search_backend()
+            await backend.aprepare()
+            filtered = backend.filter(queryset, params.search)
+        elif params.search:
+            filtered = queryset.filter(
+                Q(from_user__username__icontains=params.search)
+                | Q(to_user__username__icontains=params.search),
+            )
+        return JsonResponse(
+            await params.aresponse(
+                columns,
+                queryset,
+                filtered,
+                after=request.GET.get("after"),
+            ),
+        )
 
 
 class AssetTransferDetailView(DetailView):